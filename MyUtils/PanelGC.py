@@ -1,4 +1,9 @@
+import os
 import warnings
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 from tqdm import tqdm
 
@@ -12,8 +17,6 @@ from statsmodels.tools.sm_exceptions import InfeasibleTestError
 
 import pandas as pd
 
-idx = pd.IndexSlice
-
 import numpy as np
 
 # ################################################################################
@@ -24,12 +27,41 @@ import numpy as np
 class MyGCResults(object):
     """
     Results wrapper for "my_grangercausality". For ease of use.
+    Instead of the data itself, a 'data_loader' returning (org_data, cleaned_data)
+    can be given, which is only called once either of them is looked at.
     """
 
-    def __init__(self, org_data, cleaned_data, W, maxlag, dfd, ylags, xlags):
-        self.df = org_data
+    __slots__ = [
+        "_df",
+        "_dta",
+        "_data_loader",
+        "W",
+        "maxlag",
+        "dfn",
+        "dfd",
+        "p_value",
+        "_ylags",
+        "_xlags",
+        "K",
+        "T",
+    ]
+
+    def __init__(
+        self,
+        org_data,
+        cleaned_data,
+        W,
+        maxlag,
+        dfd,
+        ylags,
+        xlags,
+        T=None,
+        data_loader=None,
+    ):
+        self._df = org_data
+        self._dta = cleaned_data
+        self._data_loader = data_loader
 
-        self.dta = cleaned_data
         self.W = W
         self.maxlag = self.dfn = maxlag
         self.dfd = dfd
@@ -39,32 +71,104 @@ class MyGCResults(object):
         self._xlags = xlags
 
         self.K = maxlag
-        self.T = cleaned_data.shape[0]
+        self.T = cleaned_data.shape[0] if T is None else T
+
+    def _load_data(self):
+        if self._data_loader is not None:
+            self._df, self._dta = self._data_loader()
+            self._data_loader = None
+
+    @property
+    def df(self):
+        self._load_data()
+        return self._df
+
+    @property
+    def dta(self):
+        self._load_data()
+        return self._dta
 
     def __repr__(self) -> str:
         return f"{self.W, self.p_value, self.dfd, self.dfn}"
 
 
-def my_grangercausality(df, maxlag, addconst=True):
+class MyGCResultsStore(Mapping):
     """
-    Basically copy pasted original source code from "statsmodels.tsa.stattools.grangercausalitytests" and adapted it to my use case and made adjustments to handle e.g. missing values, ...
-    Dropped redundant tests from original (I just don't need them for now, but can be easily implemented)
-    I chose to keep using pandas as it allows for keeping the (time) index, which is relevant for the shift to be (time) correct original basically assumes no missing values and does a simple "naive" shift/lagging.
-    The use of pandas is probably slowing it down immensely and is not optimal at all, but it has to do (for now)
+    Columnar (W, p_value, dfd, T, K arrays) store of the individual GC results of a
+    panel, behaving as the {entity: "MyGCResults" or "Infeasible"} dict it replaces.
+    The "MyGCResults" are only created when an entity is looked up, their data
+    being rebuilt from 'data(ent)' (the [y, x] DataFrame of an entity) on demand.
     """
-    # check entries
-    if isinstance(maxlag, (int, np.int32)):
-        if maxlag <= 0:
-            raise ValueError("maxlag must a positive integer")
-        lags = np.arange(1, maxlag + 1)
-    elif isinstance(maxlag, list):
-        if len(maxlag) > 1:
-            NotImplementedError("Only one lag at a time can be tested for now")
-        lags = np.arange(1, maxlag[0] + 1)
-        lags = lags[-1:]
-    else:
-        raise NotImplementedError("maxlag must be a positive integer or list")
 
+    __slots__ = ["entities", "W", "p_value", "dfd", "T", "K", "single_lag", "_data"]
+
+    def __init__(self, entities, W, dfd, T, K, single_lag=False, data=None):
+        self.entities = entities
+        self.W = np.asarray(W, dtype=float)
+        self.dfd = np.asarray(dfd, dtype=float)
+        self.T = np.asarray(T, dtype=float)
+        self.K = np.asarray(K)
+        self.p_value = stats.f.sf(self.W, self.K, self.dfd)
+        self.single_lag = single_lag
+        self._data = data
+
+    def update_entities(self, i, W, dfd, T):
+        """
+        Overwrites the results of the entities at positions i
+        """
+        self.W[i], self.dfd[i], self.T[i] = W, dfd, T
+        self.p_value[i] = stats.f.sf(self.W[i], self.K[i], self.dfd[i])
+
+    def _entity_data(self, ent, lags):
+        df = self._data(ent)
+        return df, _lagged_frame(df, lags)[0]
+
+    def __getitem__(self, ent):
+        i = self.entities.get_loc(ent)
+        if np.isnan(self.dfd[i]):
+            return "Infeasible"
+
+        K = int(self.K[i])
+        lags = _gc_lags(K, self.single_lag)
+        return MyGCResults(
+            None,
+            None,
+            self.W[i],
+            [K] if self.single_lag else K,
+            self.dfd[i],
+            [f"y_t-{lag}" for lag in lags],
+            [f"x_t-{lag}" for lag in lags],
+            T=int(self.T[i]),
+            data_loader=(
+                None if self._data is None else (lambda: self._entity_data(ent, lags))
+            ),
+        )
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def to_frame(self):
+        return pd.DataFrame(
+            {
+                "W": self.W,
+                "p_value": self.p_value,
+                "dfd": self.dfd,
+                "T": self.T,
+                "K": self.K,
+            },
+            index=self.entities,
+        )
+
+
+def _lagged_frame(df, lags, addconst=True):
+    """
+    [y, y lags, x lags, (const)] of the [y, x] DataFrame 'df', lagged along its
+    (time) index, only keeping the complete rows.
+    Returns the data and the y lags, x lags and constant column names.
+    """
     # create lags of both time series
     dta = df.copy()
     dta.columns = ["y", "x"]
@@ -82,16 +186,50 @@ def my_grangercausality(df, maxlag, addconst=True):
         dta = add_constant(dta, prepend=False)
         const_list.append("const")
 
-    # Construct 2 exog samples for the "own" and "full" reg
     ylags = [f"y_t-{lag}" for lag in lags]
     xlags = [f"x_t-{lag}" for lag in lags]
 
+    # drop missing obs, respecting same observations (so dropna on full dta) #Warning
+    dta_noex = dta[["y"] + ylags + xlags + const_list].dropna()
+    return dta_noex, ylags, xlags, const_list
+
+
+def my_grangercausality(df, maxlag, addconst=True, lean=False):
+    """
+    Basically copy pasted original source code from "statsmodels.tsa.stattools.grangercausalitytests" and adapted it to my use case and made adjustments to handle e.g. missing values, ...
+    Dropped redundant tests from original (I just don't need them for now, but can be easily implemented)
+    I chose to keep using pandas as it allows for keeping the (time) index, which is relevant for the shift to be (time) correct original basically assumes no missing values and does a simple "naive" shift/lagging.
+    The use of pandas is probably slowing it down immensely and is not optimal at all, but it has to do (for now)
+
+    lean=True skips pandas and statsmodels altogether: 'df' can then also be a raw
+    (T x 2) numpy array [y, x] on a regular time grid (missing values as nan) and
+    both SSRs come from a single QR of the full design (see "_lean_grangercausality").
+    """
+    # check entries
+    if isinstance(maxlag, (int, np.integer)):
+        if maxlag <= 0:
+            raise ValueError("maxlag must a positive integer")
+        lags = np.arange(1, maxlag + 1)
+    elif isinstance(maxlag, list):
+        if len(maxlag) > 1:
+            raise NotImplementedError(
+                "Only one lag at a time can be tested, use "
+                "'grangercausality_lag_sweep' for several lag orders"
+            )
+        lags = np.arange(1, maxlag[0] + 1)
+        lags = lags[-1:]
+    else:
+        raise NotImplementedError("maxlag must be a positive integer or list")
+
+    if lean:
+        return _lean_grangercausality(df, maxlag, lags, addconst)
+
+    dta_noex, ylags, xlags, const_list = _lagged_frame(df, lags, addconst)
+
+    # Construct 2 exog samples for the "own" and "full" reg
     own_exog = ylags + const_list
     full_exog = ylags + xlags + const_list
 
-    # drop missing obs, respecting same observations (so dropna on full dta) #Warning
-    dta_noex = dta[["y"] + full_exog].dropna()
-
     if dta_noex.shape[0] <= len(full_exog):
         raise ValueError(
             f"The shape of the Resulting data ({dta_noex.shape[0]}) is too small to perform the necessary regressions (#exog variables = {len(full_exog)})"
@@ -119,7 +257,8 @@ def my_grangercausality(df, maxlag, addconst=True):
         )
 
     # Wald test statistic
-    W = (resown.ssr - resfull.ssr) / resfull.ssr / maxlag * resfull.df_resid
+    # (lags[-1] equals maxlag, also when it is given as a single-element list)
+    W = (resown.ssr - resfull.ssr) / resfull.ssr / lags[-1] * resfull.df_resid
     # p_value = stats.f.sf(W, maxlag, resfull.df_resid)
 
     # write necessary info to own results class
@@ -127,6 +266,1215 @@ def my_grangercausality(df, maxlag, addconst=True):
     return results
 
 
+def _lean_grangercausality(df, maxlag, lags, addconst=True):
+    """
+    Numpy version of "my_grangercausality": same sample, same perfect fit checks
+    and same "MyGCResults", but without building any DataFrame or OLS results.
+    The cleaned data is kept as a numpy array with the columns [y, ylags, xlags, const].
+    """
+    values = np.asarray(df, dtype=float)
+    n_lags = len(lags)
+    k_restricted = n_lags + int(addconst)
+    n_exog = 2 * n_lags + int(addconst)
+
+    Z, valid = _lag_design(values, np.array([0, len(values)]), lags, addconst)
+    Z = Z[valid]
+    if Z.shape[0] <= n_exog:
+        raise ValueError(
+            f"The shape of the Resulting data ({Z.shape[0]}) is too small to perform the necessary regressions (#exog variables = {n_exog})"
+        )
+
+    ssr_own, ssr_full, rank_deficient = _nested_ssr(Z, k_restricted)
+    y = Z[:, -1]
+    dfd = Z.shape[0] - n_exog
+    if rank_deficient:
+        ssr_own = _pinv_ssr(Z[:, :k_restricted], y)
+        ssr_full = _pinv_ssr(Z[:, :-1], y)
+        dfd = Z.shape[0] - np.linalg.matrix_rank(Z[:, :-1])
+
+    tss = ((y - y.mean()) ** 2).sum() if addconst else (y**2).sum()
+    if (
+        tss == 0
+        or ssr_full == 0
+        or np.isnan(1 - ssr_full / tss)
+        or (ssr_full / tss) < np.finfo(float).eps
+    ):
+        raise InfeasibleTestError(
+            "The Granger causality test statistic cannot be computed "
+            "because the VAR has a perfect fit of the data."
+        )
+
+    W = (ssr_own - ssr_full) / ssr_full / lags[-1] * dfd
+
+    ylags = [f"y_t-{lag}" for lag in lags]
+    xlags = [f"x_t-{lag}" for lag in lags]
+    # [y lags, (const), x lags, y] -> [y, y lags, x lags, (const)]
+    order = (
+        [n_exog]
+        + list(range(n_lags))
+        + list(range(k_restricted, n_exog))
+        + list(range(n_lags, k_restricted))
+    )
+    return MyGCResults(df, Z[:, order], W, maxlag, dfd, ylags, xlags)
+
+
+# ################################################################################
+# REGULAR TIME GRID
+# ################################################################################
+
+
+def _regular_grid(times, freq):
+    """
+    Labels of the "resample(freq)" bins covering the given (sorted) times
+    """
+    return pd.Series(0, index=times).resample(freq).last().index
+
+
+def _grid_bins(grid, times, freq):
+    """
+    Position on the regular grid of the bin each time falls in
+    """
+    if pd.Grouper(freq=freq).closed == "right":
+        if not isinstance(pd.tseries.frequencies.to_offset(freq), pd.offsets.Tick):
+            # resample extends these bins to the end of the label's day
+            grid = grid + pd.Timedelta(days=1) - pd.Timedelta(1, unit="ns")
+        return grid.searchsorted(times, side="left")
+    return grid.searchsorted(times, side="right") - 1
+
+
+def _common_grid(freq):
+    """
+    Whether "resample(freq)" puts every series on the same grid wherever it
+    starts: true for anchored offsets (W, ME, B, ...) and ticks dividing a day
+    (D, h, 15min, ...), not for e.g. 2D, 5h or 2W, whose bins start at every
+    series' own first day
+    """
+    offset = pd.tseries.frequencies.to_offset(freq)
+    if isinstance(offset, pd.offsets.Tick):
+        return pd.Timedelta(days=1).value % offset.nanos == 0
+    return offset.n == 1
+
+
+def _entity_bins(times, row_offsets, freq):
+    """
+    Bin of every observation (entity i in rows row_offsets[i]:row_offsets[i + 1],
+    sorted by time) as the entity's own "resample(freq)" makes it: its position on
+    a regular grid, and the labels of every entity's first and last bin.
+    All entities use the grid of the whole panel if the frequency allows it (see
+    "_common_grid"), otherwise the one of the entities starting on the same day.
+    """
+    first = times[row_offsets[:-1]]
+    if _common_grid(freq):
+        origin = np.zeros(len(first), dtype=int)
+    else:
+        _, origin = np.unique(first.normalize(), return_inverse=True)
+    lengths = np.diff(row_offsets)
+
+    bins = np.empty(len(times), dtype=int)
+    starts = np.empty(len(first), dtype="datetime64[ns]")
+    ends = np.empty(len(first), dtype="datetime64[ns]")
+    for g in np.unique(origin):
+        group = np.flatnonzero(origin == g)
+        rows = _segment_rows(row_offsets[group], lengths[group])
+        grid = _regular_grid(times[rows].unique().sort_values(), freq)
+        bins[rows] = _grid_bins(grid, times[rows], freq)
+        starts[group] = grid[bins[row_offsets[group]]]
+        ends[group] = grid[bins[row_offsets[group + 1] - 1]]
+    return bins, pd.DatetimeIndex(starts), ends
+
+
+def _fill_last(block, target, values):
+    """
+    Writes the rows of 'values' to rows 'target' (non-decreasing) of 'block',
+    keeping the last non-missing value per column when several rows share a
+    target (what ".last()" does within a resample bin)
+    """
+    for j in range(block.shape[1]):
+        _values = np.asarray(values[:, j], dtype=float)
+        observed = ~np.isnan(_values)
+        _target, _values = target[observed], _values[observed]
+        last = np.append(_target[1:] != _target[:-1], True)[: len(_target)]
+        block[_target[last], j] = _values[last]
+
+
+# ################################################################################
+# BATCHED (NUMPY) ENGINE - all entities at once instead of 2 OLS fits per entity
+# ################################################################################
+# upper bound on the number of floats in one padded (entities x rows x columns)
+# block handed to the stacked QR, keeps memory bounded for big panels
+_BATCH_MAX_CELLS = 2**24
+
+
+def _gc_lags(maxlag, single_lag=False):
+    """
+    Lags used in the regressions, same convention as "my_grangercausality"
+    (single_lag only uses the last lag, like passing maxlag as a list)
+    """
+    if single_lag:
+        return np.array([maxlag])
+    return np.arange(1, maxlag + 1)
+
+
+def _lag_design(block, offsets, lags, addconst=True):
+    """
+    Builds the lagged design for a stacked panel in one go.
+    'block' holds the [y, x] columns of all entities on their own regular time
+    grid, stacked on top of each other, with entity i living in rows
+    offsets[i]:offsets[i + 1]. Lags never cross the border between entities.
+
+    Columns are ordered as [y lags, (const), x lags, y] so the restricted ("own")
+    design is the leading column subset of the full one.
+    Returns the design and a mask of the rows without any missing value
+    (same rows "dropna" keeps in "my_grangercausality").
+    """
+    n_rows = block.shape[0]
+    lengths = np.diff(offsets)
+    # position of each row within its own entity
+    pos = np.arange(n_rows) - np.repeat(offsets[:-1], lengths)
+
+    y, x = block[:, 0], block[:, 1]
+    const = [np.ones(n_rows)] if addconst else []
+
+    def _shift(values, lag):
+        shifted = np.full(n_rows, np.nan)
+        shifted[lag:] = values[:-lag]
+        shifted[pos < lag] = np.nan
+        return shifted
+
+    ylags = [_shift(y, lag) for lag in lags]
+    xlags = [_shift(x, lag) for lag in lags]
+    Z = np.column_stack(ylags + const + xlags + [y])
+    valid = ~np.isnan(Z).any(axis=1)
+    return Z, valid
+
+
+def _first_dependent_column(R):
+    """
+    Index of the first column that is (numerically) a combination of the previous
+    ones, number of regressors if there is none
+    """
+    p = R.shape[-1] - 1
+    diag = np.abs(np.diagonal(R, axis1=-2, axis2=-1)[..., :p])
+    tol = diag.max(axis=-1, initial=0) * max(R.shape[-2], p) * np.finfo(float).eps
+    dependent = diag <= tol[..., None]
+    return np.where(dependent.any(axis=-1), dependent.argmax(axis=-1), p)
+
+
+def _nested_ssr(Z, k_restricted):
+    """
+    SSR of the full and the restricted regression from a single QR.
+    Z is (..., n, p + 1) with the response in the last column and the
+    restricted regressors in the first 'k_restricted' columns. Zero rows
+    (padding) do not change R, so stacks of different lengths can be mixed.
+    Also flags designs that are (numerically) rank deficient, those need the
+    pseudo-inverse to match statsmodels.
+    """
+    p = Z.shape[-1] - 1
+    R = np.linalg.qr(Z, mode="r")
+    ssr_full = R[..., p, p] ** 2
+    ssr_restricted = (R[..., k_restricted:, p] ** 2).sum(axis=-1)
+    rank_deficient = _first_dependent_column(R) < p
+    return ssr_restricted, ssr_full, rank_deficient
+
+
+def _pinv_ssr(X, y):
+    """
+    SSR using the pseudo-inverse (what statsmodels' OLS does, which then also
+    takes n - rank(X) as the residual degrees of freedom)
+    """
+    resid = y - X @ (np.linalg.pinv(X) @ y)
+    return resid @ resid
+
+
+def _segment_rows(starts, lengths):
+    """
+    Concatenation of the ranges starts[i]:starts[i] + lengths[i]
+    """
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])
+
+
+def _length_chunks(lengths, n_cols):
+    """
+    Splits (sorted) entity lengths into consecutive chunks whose zero-padded
+    (entities x max length x n_cols) block stays below _BATCH_MAX_CELLS
+    """
+    i = 0
+    while i < len(lengths):
+        j = i + 1
+        while (
+            j < len(lengths) and (j - i + 1) * lengths[j] * n_cols <= _BATCH_MAX_CELLS
+        ):
+            j += 1
+        yield np.arange(i, j)
+        i = j
+
+
+def _complete_rows(valid, offsets):
+    """
+    Number of rows without missing values of every entity
+    """
+    N = len(offsets) - 1
+    entity = np.repeat(np.arange(N), np.diff(offsets))
+    return np.bincount(entity[valid], minlength=N)
+
+
+def _padded_chunks(Z, valid, offsets, entities):
+    """
+    Yields (chunk, n, padded) for groups of the given entities of similar length:
+    the entities, their number of complete rows and those rows in a zero-padded
+    (entities x max(n) x columns) array (see "_length_chunks")
+    """
+    N = len(offsets) - 1
+    entity = np.repeat(np.arange(N), np.diff(offsets))[valid]
+    Z = Z[valid]
+    n_i = np.bincount(entity, minlength=N)
+    starts = np.concatenate([[0], np.cumsum(n_i)])
+    pos = np.arange(len(entity)) - starts[entity]
+
+    entities = entities[np.argsort(n_i[entities], kind="stable")]
+    for chunk in _length_chunks(n_i[entities], Z.shape[1]):
+        chunk = entities[chunk]
+        _n = n_i[chunk]
+        rows = _segment_rows(starts[chunk], _n)
+        padded = np.zeros((len(chunk), _n.max(), Z.shape[1]))
+        padded[np.repeat(np.arange(len(chunk)), _n), pos[rows]] = Z[rows]
+        yield chunk, _n, padded
+
+
+def _padded_tss(y, n, addconst=True):
+    """
+    (Un)centered total sum of squares of zero-padded responses (entities x rows)
+    """
+    if not addconst:
+        return (y**2).sum(axis=1)
+    mask = np.arange(y.shape[1]) < n[:, None]
+    mean = y.sum(axis=1) / n
+    return (np.where(mask, y - mean[:, None], 0.0) ** 2).sum(axis=1)
+
+
+def _perfect_fit(tss, ssr):
+    """
+    Same perfect fit conditions "my_grangercausality" checks
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (tss == 0) | (ssr == 0) | (ssr / tss < np.finfo(float).eps)
+
+
+def _batched_gc(block, offsets, maxlag, single_lag=False, addconst=True):
+    """
+    Individual Granger causality tests of all entities of a stacked panel (see
+    "_lag_design"), solving all restricted and unrestricted regressions with a
+    stacked QR on zero-padded groups of entities of similar length.
+    Gives the same W and T as running "my_grangercausality" entity per entity.
+
+    Returns W, T, dfd and a boolean array flagging the entities with too few
+    observations ("my_grangercausality" raises a ValueError for those).
+    """
+    lags = _gc_lags(maxlag, single_lag)
+    n_lags = len(lags)
+    k_restricted = n_lags + int(addconst)
+    n_exog = 2 * n_lags + int(addconst)
+
+    N = len(offsets) - 1
+    Z, valid = _lag_design(block, offsets, lags, addconst)
+    too_small = _complete_rows(valid, offsets) <= n_exog
+    W = np.full(N, np.nan)
+    T = np.full(N, np.nan)
+    dfd = np.full(N, np.nan)
+
+    feasible = np.flatnonzero(~too_small)
+    for chunk, _n, padded in _padded_chunks(Z, valid, offsets, feasible):
+        ssr_own, ssr_full, rank_deficient = _nested_ssr(padded, k_restricted)
+        _dfd = _n - n_exog
+        for c in np.flatnonzero(rank_deficient):
+            X, _y = padded[c, : _n[c], :-1], padded[c, : _n[c], -1]
+            ssr_own[c] = _pinv_ssr(X[:, :k_restricted], _y)
+            ssr_full[c] = _pinv_ssr(X, _y)
+            _dfd[c] = _n[c] - np.linalg.matrix_rank(X)
+
+        tss = _padded_tss(padded[..., -1], _n, addconst)
+        if np.any(_perfect_fit(tss, ssr_full)):
+            raise InfeasibleTestError(
+                "The Granger causality test statistic cannot be computed "
+                "because the VAR has a perfect fit of the data."
+            )
+
+        dfd[chunk] = _dfd
+        T[chunk] = _n
+        W[chunk] = (ssr_own - ssr_full) / ssr_full / maxlag * dfd[chunk]
+
+    return W, T, dfd, too_small
+
+
+# ################################################################################
+# LAG SWEEP - all lag orders 1..K_max from the lag matrix of K_max
+# ################################################################################
+
+
+def _tail_ssr(R, first_rows):
+    """
+    SSR of the regressions on the leading columns of a (stack of) augmented
+    design(s) with triangular factor R (response in the last column): regressing on
+    the first k columns leaves the squared entries of R[k:, -1]
+    """
+    tail = np.cumsum((R[..., ::-1, -1] ** 2), axis=-1)[..., ::-1]
+    return tail[..., first_rows]
+
+
+def _sweep_orders(max_lag, addconst=True):
+    """
+    Column orders of the "_lag_design" columns [y lags, (const), x lags, y] for the
+    lag sweep: [(const), y_1, x_1, y_2, x_2, ..., y] and [(const), y lags, y]
+    """
+    k_restricted = max_lag + int(addconst)
+    const = [max_lag] if addconst else []
+    interleaved = [col for k in range(max_lag) for col in (k, k_restricted + k)]
+    full_order = const + interleaved + [2 * max_lag + int(addconst)]
+    own_order = const + list(range(max_lag)) + [full_order[-1]]
+    return full_order, own_order
+
+
+def _batched_lag_sweep(block, offsets, max_lag, addconst=True):
+    """
+    Individual GC tests for every lag order K = 1..max_lag of all entities of a
+    stacked panel (see "_lag_design") in a single pass.
+    The lag matrix is built once for max_lag and every K uses the same sample (the
+    complete rows for max_lag), so that W's are comparable across lag orders.
+    With the columns ordered as [const, y_1, x_1, y_2, x_2, ...] every unrestricted
+    regression of order K uses a leading block of columns, [const, y_1, ..., y_K]
+    does the same for the restricted ones: one QR per ordering gives all the SSRs.
+
+    Returns W (N x max_lag), T (N), dfd (N x max_lag) and a boolean array flagging
+    entities with too few observations for max_lag. Perfect fits give nan.
+    """
+    lags = np.arange(1, max_lag + 1)
+    c = int(addconst)
+    n_exog = 2 * max_lag + c
+
+    N = len(offsets) - 1
+    Z, valid = _lag_design(block, offsets, lags, addconst)
+    full_order, own_order = _sweep_orders(max_lag, addconst)
+
+    too_small = _complete_rows(valid, offsets) <= n_exog
+    W = np.full((N, max_lag), np.nan)
+    T = np.full(N, np.nan)
+    dfd = np.full((N, max_lag), np.nan)
+
+    n_full = 2 * lags + c  # number of regressors for every K
+    n_own = lags + c
+    feasible = np.flatnonzero(~too_small)
+    for chunk, _n, padded in _padded_chunks(Z, valid, offsets, feasible):
+        R_full = np.linalg.qr(padded[..., full_order], mode="r")
+        R_own = np.linalg.qr(padded[..., own_order], mode="r")
+        ssr_full = _tail_ssr(R_full, n_full)
+        ssr_own = _tail_ssr(R_own, n_own)
+
+        # rank deficient regressions use the pseudo-inverse, like statsmodels
+        deficient_full = n_full > _first_dependent_column(R_full)[:, None]
+        deficient_own = n_own > _first_dependent_column(R_own)[:, None]
+        _dfd = _n[:, None] - n_full
+        for c_i, k in zip(*np.nonzero(deficient_full | deficient_own)):
+            X, _y = padded[c_i, : _n[c_i], :-1], padded[c_i, : _n[c_i], -1]
+            X_full = X[:, np.array(full_order[: n_full[k]])]
+            ssr_full[c_i, k] = _pinv_ssr(X_full, _y)
+            ssr_own[c_i, k] = _pinv_ssr(X[:, np.array(own_order[: n_own[k]])], _y)
+            _dfd[c_i, k] = _n[c_i] - np.linalg.matrix_rank(X_full)
+
+        tss = _padded_tss(padded[..., -1], _n, addconst)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            _W = (ssr_own - ssr_full) / ssr_full / lags * _dfd
+        W[chunk] = np.where(_perfect_fit(tss[:, None], ssr_full), np.nan, _W)
+        dfd[chunk] = _dfd
+        T[chunk] = _n
+
+    return W, T, dfd, too_small
+
+
+def grangercausality_lag_sweep(df, max_lag, addconst=True):
+    """
+    Granger causality tests of x on y (columns [y, x] of 'df' on a regular time grid)
+    for every lag order 1..max_lag at once, all on the sample of max_lag.
+    Returns a DataFrame indexed by the lag order with W, p_value, dfn, dfd and T.
+    """
+    values = np.asarray(df, dtype=float)
+    offsets = np.array([0, len(values)])
+    W, T, dfd, too_small = _batched_lag_sweep(values, offsets, max_lag, addconst)
+    if too_small[0]:
+        raise ValueError(
+            f"The shape of the Resulting data is too small to perform the necessary regressions (#exog variables = {2 * max_lag + int(addconst)})"
+        )
+    K = np.arange(1, max_lag + 1)
+    return pd.DataFrame(
+        {
+            "W": W[0],
+            "p_value": stats.f.sf(W[0], K, dfd[0]),
+            "dfn": K,
+            "dfd": dfd[0],
+            "T": T[0],
+        },
+        index=pd.Index(K, name="lag_order"),
+    )
+
+
+def information_criterion_lag(max_lag, criterion="bic", addconst=True):
+    """
+    Returns a function that picks the lag order (1..max_lag) of one entity's [y, x]
+    values (regular time grid) with the lowest AIC/BIC of the unrestricted
+    regression, all lag orders compared on the same sample.
+    Series too short for max_lag get the largest lag order they can handle.
+    To be used as "PanelGC(data, maxlag=information_criterion_lag(10), ...)"
+    """
+    if criterion not in ["aic", "bic"]:
+        raise ValueError("criterion must be either 'aic' or 'bic'")
+    c = int(addconst)
+
+    def _select(values):
+        values = np.asarray(values, dtype=float)
+        for _max_lag in range(max_lag, 0, -1):
+            lags = np.arange(1, _max_lag + 1)
+            Z, valid = _lag_design(values, np.array([0, len(values)]), lags, addconst)
+            n = valid.sum()
+            if n > 2 * _max_lag + c:
+                break
+        else:
+            return 1
+
+        full_order, _ = _sweep_orders(_max_lag, addconst)
+        R = np.linalg.qr(Z[valid][:, full_order], mode="r")
+        k = 2 * lags + c
+        with np.errstate(divide="ignore"):
+            fit = n * np.log(_tail_ssr(R, k) / n)
+        penalty = 2 * k if criterion == "aic" else np.log(n) * k
+        return int(lags[np.argmin(fit + penalty)])
+
+    return _select
+
+
+# ################################################################################
+# DH STATISTICS - vectorized, also used for many lag orders/windows at once
+# ################################################################################
+
+
+def _E_W_tilde(K, T):
+    return K * (T - 2 * K - 1) / (T - 2 * K - 3)
+
+
+def _Var_W_tilde(K, T):
+    return (
+        2
+        * K
+        * (T - 2 * K - 1) ** 2
+        * (T - K - 3)
+        / ((T - 2 * K - 3) ** 2 * (T - 2 * K - 5))
+    )
+
+
+def _dh_statistics(W, T, K):
+    """
+    Dumitrescu-Hurlin statistics over the first axis (entities) of W, T and K
+    (broadcastable), leaving out the entities not fulfilling T > 5 + 2K or without W
+    """
+    with np.errstate(invalid="ignore"):
+        mask = (T > 5 + 2 * K) & ~np.isnan(W)
+    N_masked = mask.sum(axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        W_bar = np.nanmean(np.where(mask, W, np.nan), axis=0)
+        E_W = np.nanmean(np.where(mask, _E_W_tilde(K, T), np.nan), axis=0)
+        Var_W = np.nanmean(np.where(mask, _Var_W_tilde(K, T), np.nan), axis=0)
+    Z_bar_tilde = np.sqrt(N_masked) * (W_bar - E_W) / np.sqrt(Var_W)
+    return {
+        "W_bar": W_bar,
+        "Z_bar_tilde": Z_bar_tilde,
+        "p_value": stats.norm.sf(Z_bar_tilde),
+        "N_masked": N_masked,
+    }
+
+
+def _lag_groups(block, offsets, K):
+    """
+    Yields (K, entities, block, offsets) for every group of entities sharing a lag
+    order, so each group can be solved in one batch
+    """
+    N = len(offsets) - 1
+    lengths = np.diff(offsets)
+    for maxlag in np.unique(K):
+        group = np.flatnonzero(K == maxlag)
+        if len(group) == N:
+            yield int(maxlag), group, block, offsets
+        else:
+            _block = block[_segment_rows(offsets[group], lengths[group])]
+            _offsets = np.concatenate([[0], np.cumsum(lengths[group])])
+            yield int(maxlag), group, _block, _offsets
+
+
+def _individual_gc(block, offsets, starts, K, freq, single_lag, engine, progress=True):
+    """
+    Individual GC tests of all entities of a stacked panel (see "_lag_design"),
+    'starts' holding the first date of each entity's time grid and 'K' the lag
+    order of each entity.
+    Returns W, T and dfd of every entity (nan if infeasible).
+    """
+    N = len(offsets) - 1
+    W = np.full(N, np.nan)
+    T = np.full(N, np.nan)  # nan will cause the mask to cancel this obs out
+    dfd = np.full(N, np.nan)
+    if engine == "numpy":
+        for maxlag, group, _block, _offsets in _lag_groups(block, offsets, K):
+            W[group], T[group], dfd[group], _ = _batched_gc(
+                _block, _offsets, maxlag, single_lag
+            )
+        return W, T, dfd
+
+    for i in tqdm(range(N), desc="Individual GC", leave=False, disable=not progress):
+        _temp = pd.DataFrame(
+            block[offsets[i] : offsets[i + 1]],
+            index=pd.date_range(
+                starts[i], periods=offsets[i + 1] - offsets[i], freq=freq
+            ),
+            columns=["y", "x"],
+        )
+        try:
+            if single_lag:
+                _max_lag = [K[i]]
+            else:
+                _max_lag = K[i]
+            gc = my_grangercausality(_temp, maxlag=_max_lag)
+            W[i] = gc.W
+            T[i] = gc.T
+            dfd[i] = gc.dfd
+
+        except ValueError:
+            # infeasible, W, T and dfd are left nan
+            pass
+
+    return W, T, dfd
+
+
+# ################################################################################
+# SUFFICIENT STATISTICS - GC tests from cross-products of the augmented design
+# ################################################################################
+
+
+def _crossprod(Z, valid, offsets):
+    """
+    Z'Z of the complete rows of the augmented design (see "_lag_design") of every
+    entity of a stacked panel (entities x p + 1 x p + 1)
+    """
+    N = len(offsets) - 1
+    C = np.zeros((N, Z.shape[1], Z.shape[1]))
+    for chunk, _, padded in _padded_chunks(Z, valid, offsets, np.arange(N)):
+        C[chunk] = np.einsum("cnp,cnq->cpq", padded, padded)
+    return C
+
+
+def _add_outer(C, entities, Z, sign=1):
+    """
+    Adds (sign = 1) or drops (sign = -1) the outer products of the rows of Z to the
+    cross-products C of their entities
+    """
+    np.add.at(C, entities, sign * Z[:, :, None] * Z[:, None, :])
+
+
+def _crossprod_ssr(C, k_restricted):
+    """
+    SSR of the full and restricted regressions from the cross-products of (stacks
+    of) augmented designs: the Cholesky factor of Z'Z is the R of a QR of Z.
+    Singular (rank deficient) cross-products use the pseudo-inverse.
+    Also returns the rank of the full design (the number of regressors unless
+    rank deficient).
+    """
+    p = C.shape[-1] - 1
+    try:
+        L = np.linalg.cholesky(C)
+    except np.linalg.LinAlgError:
+        # only the singular ones are left to the pseudo-inverse
+        eigenvalues = np.linalg.eigvalsh(C)
+        singular = eigenvalues[:, 0] <= eigenvalues[:, -1] * 1e-10
+        L = np.zeros_like(C)
+        L[~singular] = np.linalg.cholesky(C[~singular])
+    dependent = _first_dependent_column(np.swapaxes(L, -1, -2)) < p
+    ssr_full = L[:, p, p] ** 2
+    ssr_own = (L[:, p, k_restricted:] ** 2).sum(axis=-1)
+    rank = np.full(len(C), p)
+
+    for c in np.flatnonzero(dependent):
+        for k, ssr in [(p, ssr_full), (k_restricted, ssr_own)]:
+            xy = C[c, :k, p]
+            ssr[c] = C[c, p, p] - xy @ np.linalg.pinv(C[c, :k, :k]) @ xy
+        rank[c] = np.linalg.matrix_rank(C[c, :p, :p], hermitian=True)
+    return ssr_own, ssr_full, rank
+
+
+def _drop_constant(C, n_lags):
+    keep = np.delete(np.arange(C.shape[-1]), n_lags)
+    return C[:, keep][:, :, keep]
+
+
+def _gc_from_crossprod(
+    C, maxlag, single_lag=False, addconst=True, raise_perfect_fit=True
+):
+    """
+    Individual GC tests (W, T, dfd, too_small as in "_batched_gc") from the
+    cross-products of the augmented designs [y lags, const, x lags, y].
+    The constant is always part of the cross-products, its square counting the
+    rows, and is dropped from the regressions if not 'addconst'.
+    raise_perfect_fit=False gives nan for perfect fits instead of raising (as in
+    "_batched_lag_sweep"), e.g. for windows over a stale stretch of a series.
+    """
+    lags = _gc_lags(maxlag, single_lag)
+    k_restricted = len(lags) + int(addconst)
+    n_exog = 2 * len(lags) + int(addconst)
+
+    n = C[:, len(lags), len(lags)]
+    if not addconst:
+        C = _drop_constant(C, len(lags))
+    too_small = n <= n_exog
+    W = np.full(len(C), np.nan)
+    T = np.full(len(C), np.nan)
+    dfd = np.full(len(C), np.nan)
+
+    ok = ~too_small
+    ssr_own, ssr_full, rank = _crossprod_ssr(C[ok], k_restricted)
+    _C = C[ok]
+    if addconst:
+        tss = _C[:, -1, -1] - _C[:, len(lags), -1] ** 2 / n[ok]
+    else:
+        tss = _C[:, -1, -1]
+    perfect_fit = _perfect_fit(tss, ssr_full)
+    if raise_perfect_fit and np.any(perfect_fit):
+        raise InfeasibleTestError(
+            "The Granger causality test statistic cannot be computed "
+            "because the VAR has a perfect fit of the data."
+        )
+
+    fit = np.flatnonzero(ok)[~perfect_fit]
+    T[fit] = np.round(n[fit])
+    dfd[fit] = T[fit] - rank[~perfect_fit]
+    W[fit] = (ssr_own - ssr_full)[~perfect_fit] / ssr_full[~perfect_fit]
+    W[fit] *= dfd[fit] / maxlag
+    return W, T, dfd, too_small
+
+
+# ################################################################################
+# ROLLING WINDOWS
+# ################################################################################
+
+
+def _rolling_crossprod(block, offsets, first, K, window, step=1, single_lag=False):
+    """
+    Cross-products of the augmented designs of all entities of a stacked panel over
+    windows of 'window' periods on a common grid ('first' being the grid position
+    of every entity's first row), sliding by 'step' periods.
+    As in a test on the window's data only, a row is in the window if it and its
+    K lags are. Each slide adds the rows entering and drops the rows leaving, the
+    cross-products are refreshed from scratch once every window to avoid drift.
+    Yields (window end, [(K, entities, cross-products) for every lag order group]).
+    """
+    lengths = np.diff(offsets)
+    G = int(np.max(first + lengths))
+    groups = []
+    for maxlag, group, _block, _offsets in _lag_groups(block, offsets, K):
+        Z, valid = _lag_design(_block, _offsets, _gc_lags(maxlag, single_lag))
+        pos = np.repeat(first[group] - _offsets[:-1], lengths[group])
+        ent = np.repeat(np.arange(len(group)), lengths[group])[valid]
+        t = (np.arange(len(Z)) + pos)[valid]
+        Z = Z[valid]
+        # rows sorted by the window end at which they enter and the window start
+        # at which they leave
+        enter, leave = np.argsort(t, kind="stable"), np.argsort(
+            t - maxlag, kind="stable"
+        )
+        C = np.zeros((len(group), Z.shape[1], Z.shape[1]))
+        groups.append(
+            (maxlag, group, Z, ent, t, enter, t[enter], leave, t[leave] - maxlag, C)
+        )
+
+    refreshed = -np.inf
+    previous = -1
+    for end in range(window - 1, G, step):
+        start = end - window + 1
+        refresh = end - refreshed >= window
+        for maxlag, group, Z, ent, t, enter, t_enter, leave, t_leave, C in groups:
+            if refresh:
+                inside = (t <= end) & (t - maxlag >= start)
+                C[:] = 0
+                _add_outer(C, ent[inside], Z[inside])
+            else:
+                lo, hi = np.searchsorted(t_enter, [previous, end], side="right")
+                _add_outer(C, ent[enter[lo:hi]], Z[enter[lo:hi]])
+                lo, hi = np.searchsorted(t_leave, [previous - window + 1, start])
+                _add_outer(C, ent[leave[lo:hi]], Z[leave[lo:hi]], sign=-1)
+        if refresh:
+            refreshed = end
+        previous = end
+        yield end, [(group[0], group[1], group[-1]) for group in groups]
+
+
+def rolling_grangercausality(df, maxlag, window, step=1, addconst=True):
+    """
+    Granger causality test of x on y (columns [y, x] of 'df', as in
+    "my_grangercausality") over rolling windows of 'window' rows, sliding by 'step'.
+    Returns a DataFrame indexed by the window's last date with W, p_value, dfn, dfd,
+    T and the coefficients of the x lags (and their standard errors 'stdv_...'),
+    e.g. "general.plot_rolling_regression_results(res['x_t-1'], res['stdv_x_t-1'],
+    res.index)". Windows with a perfect fit get a nan W (and dfd, T).
+    """
+    lags = _gc_lags(maxlag, False)
+    if window <= 2 * len(lags) + int(addconst):
+        raise ValueError("The window is too small to perform the necessary regressions")
+    values = np.asarray(df, dtype=float)
+    offsets = np.array([0, len(values)])
+    k_restricted = len(lags) + int(addconst)
+    xlags = [f"x_t-{lag}" for lag in lags]
+
+    ends, C = [], []
+    for end, ((_, _, _C),) in _rolling_crossprod(
+        values, offsets, np.array([0]), np.array([maxlag]), window, step
+    ):
+        ends.append(end)
+        C.append(_C[0].copy())
+    C = np.array(C)
+    W, T, dfd, too_small = _gc_from_crossprod(
+        C, maxlag, addconst=addconst, raise_perfect_fit=False
+    )
+    if not addconst:
+        C = _drop_constant(C, len(lags))
+
+    # coefficients of the unrestricted regression
+    p = C.shape[-1] - 1
+    XX_inv = np.linalg.pinv(C[:, :p, :p])
+    beta = np.einsum("npq,nq->np", XX_inv, C[:, :p, p])
+    sigma2 = (C[:, p, p] - np.einsum("np,np->n", beta, C[:, :p, p])) / dfd
+    stdv = np.sqrt(sigma2[:, None] * np.diagonal(XX_inv, axis1=1, axis2=2))
+
+    res = pd.DataFrame(
+        {
+            "W": W,
+            "p_value": stats.f.sf(W, len(lags), dfd),
+            "dfn": len(lags),
+            "dfd": dfd,
+            "T": T,
+        },
+        index=df.index[ends],
+    )
+    for j, name in enumerate(xlags):
+        res[name] = beta[:, k_restricted + j]
+        res[f"stdv_{name}"] = stdv[:, k_restricted + j]
+    res.loc[too_small] = np.nan
+    return res
+
+
+# ################################################################################
+# PARALLEL EXECUTION - contiguous chunks of entities on a process pool
+# ################################################################################
+
+
+@contextmanager
+def _shared_block(block):
+    """
+    Copies 'block' to shared memory for the duration of the context, yields its name
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(block.nbytes, 1))
+    try:
+        _shared = np.ndarray(block.shape, dtype=float, buffer=shm.buf)
+        _shared[:] = block
+        del _shared
+        yield shm.name
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _chunk_worker(func, shm_name, shape, offsets, *args):
+    """
+    Runs on a worker process: attaches to the shared panel block and only copies
+    out its own rows (offsets[0]:offsets[-1]) instead of unpickling a DataFrame,
+    then runs func(block, offsets, *args) on them
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _shared = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        block = _shared[offsets[0] : offsets[-1]].copy()
+        del _shared
+    finally:
+        shm.close()
+
+    return func(block, offsets - offsets[0], *args)
+
+
+def _chunk_bounds(offsets, n_chunks):
+    """
+    Entity boundaries of (at most) n_chunks contiguous chunks with roughly the
+    same number of rows
+    """
+    N = len(offsets) - 1
+    targets = np.linspace(0, offsets[-1], n_chunks + 1)
+    bounds = np.searchsorted(offsets, targets)
+    return np.unique(np.clip(np.concatenate([[0], bounds, [N]]), 0, N))
+
+
+def _map_entity_chunks(
+    func, block, offsets, entity_args, args, n_jobs=None, executor=None, desc=None
+):
+    """
+    Runs func(block, offsets, *entity_args, *args) on contiguous chunks of entities
+    in parallel, 'entity_args' being per-entity arrays that get sliced per chunk.
+    The panel block is put in shared memory once, so every worker only reads its own
+    slice. Returns the outputs of the chunks in the original entity order.
+    """
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return _map_entity_chunks(
+                func, block, offsets, entity_args, args, n_jobs, executor, desc
+            )
+
+    n_workers = getattr(executor, "_max_workers", None) or os.cpu_count()
+    bounds = _chunk_bounds(offsets, 4 * n_workers)
+
+    with _shared_block(block) as shm_name:
+        futures = [
+            executor.submit(
+                _chunk_worker,
+                func,
+                shm_name,
+                block.shape,
+                offsets[a : b + 1],
+                *[arg[a:b] for arg in entity_args],
+                *args,
+            )
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        return [future.result() for future in tqdm(futures, desc=desc, leave=False)]
+
+
+def _parallel_gc(
+    block, offsets, starts, K, freq, single_lag, engine, n_jobs=None, executor=None
+):
+    """
+    "_individual_gc" on chunks of entities in parallel (see "_map_entity_chunks"),
+    results merged back in the original entity order
+    """
+    chunks = _map_entity_chunks(
+        _individual_gc,
+        block,
+        offsets,
+        (starts, K),
+        (freq, single_lag, engine, False),
+        n_jobs,
+        executor,
+        desc="Individual GC",
+    )
+    W, T, dfd = (np.concatenate(parts) for parts in zip(*chunks))
+    return W, T, dfd
+
+
+# ################################################################################
+# NETWORK GC - every ordered pair of the columns of a wide DataFrame
+# ################################################################################
+
+
+def _lag_stack(values, lags):
+    """
+    Lags of every column of 'values' (T x series), as (T x series x lags),
+    shifted along the rows like "my_grangercausality" does
+    """
+    L = np.full(values.shape + (len(lags),), np.nan)
+    for k, lag in enumerate(lags):
+        L[lag:, :, k] = values[:-lag]
+    return L
+
+
+def _gc_given_restricted(y, X_r, X, maxlag, addconst=True):
+    """
+    GC tests of the lag blocks X (causes x n x K) of many causes on the same sample
+    and restricted design X_r (n x k_restricted, own lags and constant) of one target
+    y: the restricted regression is done once and every cause only regresses its
+    lags, made orthogonal to X_r, on the restricted residuals.
+    Returns W (nan for a perfect fit) and a mask of the causes whose lags are
+    (numerically) collinear with the restricted design, which are left nan. Raises LinAlgError if the restricted
+    design itself is rank deficient.
+    """
+    n, k_restricted = X_r.shape
+    K = X.shape[-1]
+    Q_r, R_r = np.linalg.qr(np.column_stack([X_r, y]))
+    if _first_dependent_column(R_r) < k_restricted:
+        raise np.linalg.LinAlgError("Rank deficient restricted design")
+    Q_r = Q_r[:, :k_restricted]
+    resid = y - Q_r @ (Q_r.T @ y)
+    ssr_own = resid @ resid
+
+    MX = X - Q_r @ (Q_r.T @ X)
+    R = np.linalg.qr(
+        np.concatenate([MX, np.broadcast_to(resid[:, None], (len(X), n, 1))], axis=2),
+        mode="r",
+    )
+    ssr_full = R[:, K, K] ** 2
+
+    # collinearity relative to the scale of the lags before projecting
+    tol = np.sqrt((X**2).sum(axis=1)).max(axis=-1) * max(n, K) * np.finfo(float).eps
+    dependent = (np.abs(np.diagonal(R, axis1=1, axis2=2)[:, :K]) <= tol[:, None]).any(
+        axis=-1
+    )
+    tss = ((y - y.mean()) ** 2).sum() if addconst else (y**2).sum()
+    dfd = n - k_restricted - K
+    with np.errstate(divide="ignore", invalid="ignore"):
+        W = (ssr_own - ssr_full) / ssr_full / maxlag * dfd
+    W[dependent | _perfect_fit(tss, ssr_full)] = np.nan
+    return W, dependent
+
+
+def _gc_masked(y, X_r, X, valid, maxlag, addconst=True):
+    """
+    GC tests of the lag blocks X (causes x n x K) on a target y with restricted
+    design X_r, each cause only using its 'valid' rows (causes x n): invalid rows
+    are zeroed so all causes are solved in one stacked QR.
+    Returns W and dfd (nan if the sample is too small)
+    """
+    k_restricted = X_r.shape[1]
+    n_exog = k_restricted + X.shape[-1]
+    Z = np.concatenate(
+        [
+            np.broadcast_to(X_r, (len(X),) + X_r.shape),
+            X,
+            np.broadcast_to(y[:, None], (len(X), len(y), 1)),
+        ],
+        axis=2,
+    )
+    Z = np.where(valid[:, :, None], Z, 0.0)
+    ssr_own, ssr_full, rank_deficient = _nested_ssr(Z, k_restricted)
+    rank = np.full(len(Z), n_exog)
+    for c in np.flatnonzero(rank_deficient):
+        _Z = Z[c, valid[c]]
+        ssr_own[c] = _pinv_ssr(_Z[:, :k_restricted], _Z[:, -1])
+        ssr_full[c] = _pinv_ssr(_Z[:, :-1], _Z[:, -1])
+        rank[c] = np.linalg.matrix_rank(_Z[:, :-1])
+
+    n = valid.sum(axis=1)
+    if addconst:
+        with np.errstate(invalid="ignore"):
+            mean = (Z[:, :, -1]).sum(axis=1) / n
+        tss = (np.where(valid, y - mean[:, None], 0.0) ** 2).sum(axis=1)
+    else:
+        tss = (Z[:, :, -1] ** 2).sum(axis=1)
+
+    dfd = np.where(n > n_exog, n - rank, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        W = (ssr_own - ssr_full) / ssr_full / maxlag * dfd
+    W[_perfect_fit(tss, ssr_full)] = np.nan
+    return W, dfd
+
+
+def _network_targets(values, L, targets, maxlag, addconst=True, chunk_size=64):
+    """
+    W and dfd (series x targets) of the GC tests of every series (rows) on each of
+    the 'targets' (columns) of 'values' (T x series), 'L' being their lags (see
+    "_lag_stack"). Causes without missing lags on the target's sample share its
+    restricted regression ("_gc_given_restricted"), the others (and collinear ones)
+    get their own sample ("_gc_masked"). Causes are done 'chunk_size' at a time.
+    """
+    M = values.shape[1]
+    K = L.shape[-1]
+    n_exog = 2 * K + int(addconst)
+    lags_ok = ~np.isnan(L).any(axis=-1)
+
+    W = np.full((M, len(targets)), np.nan)
+    dfd = np.full((M, len(targets)), np.nan)
+    for t, j in enumerate(targets):
+        rows = np.flatnonzero(~np.isnan(values[:, j]) & lags_ok[:, j])
+        n = len(rows)
+        if n <= n_exog:
+            continue
+        y = values[rows, j]
+        X_r = np.column_stack([L[rows, j]] + [np.ones(n)] * int(addconst))
+
+        causes = np.delete(np.arange(M), j)
+        shared = lags_ok[rows[:, None], causes].all(axis=0)
+        masked = [causes[~shared]]
+        for a in range(0, shared.sum(), chunk_size):
+            chunk = causes[shared][a : a + chunk_size]
+            X = np.moveaxis(L[rows[:, None], chunk], 1, 0)
+            try:
+                _W, dependent = _gc_given_restricted(y, X_r, X, maxlag, addconst)
+            except np.linalg.LinAlgError:
+                masked.append(chunk)
+                continue
+            W[chunk, t] = _W
+            dfd[chunk, t] = n - n_exog
+            masked.append(chunk[dependent])
+
+        masked = np.concatenate(masked)
+        for a in range(0, len(masked), chunk_size):
+            chunk = masked[a : a + chunk_size]
+            X = np.moveaxis(np.nan_to_num(L[rows[:, None], chunk]), 1, 0)
+            valid = lags_ok[rows[:, None], chunk].T
+            W[chunk, t], dfd[chunk, t] = _gc_masked(y, X_r, X, valid, maxlag, addconst)
+    return W, dfd
+
+
+def _network_worker(shm_names, shapes, targets, maxlag, addconst, chunk_size):
+    """
+    Runs on a worker process: "_network_targets" on the shared values and lags,
+    without copying them
+    """
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    try:
+        values, L = [
+            np.ndarray(shape, dtype=float, buffer=shm.buf)
+            for shm, shape in zip(shms, shapes)
+        ]
+        out = _network_targets(values, L, targets, maxlag, addconst, chunk_size)
+        del values, L
+        return out
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+def network_grangercausality(
+    df, maxlag, addconst=True, n_jobs=1, executor=None, chunk_size=64
+):
+    """
+    Granger causality tests of every column of the wide DataFrame 'df' (time x
+    series) on every other one, each pair as "my_grangercausality" would do on
+    df[[target, cause]]. The lags of every series are built once and the own-lag
+    (restricted) regression of every target is shared by all its causes.
+    Targets are spread over 'n_jobs' processes (-1: all cores, or any
+    concurrent.futures 'executor'), causes are done 'chunk_size' at a time to
+    bound memory.
+    Returns the W statistics and p-values as (series x series) DataFrames with the
+    causes as rows and the targets as columns (nan on the diagonal and for
+    infeasible pairs).
+    """
+    if not isinstance(maxlag, (int, np.integer)) or maxlag <= 0:
+        raise ValueError("maxlag must a positive integer")
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs != 1 and executor is None:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return network_grangercausality(
+                df, maxlag, addconst, n_jobs, executor, chunk_size
+            )
+
+    values = np.asarray(df, dtype=float)
+    M = values.shape[1]
+    L = _lag_stack(values, _gc_lags(maxlag))
+    args = (maxlag, addconst, chunk_size)
+    if executor is None:
+        W, dfd = _network_targets(values, L, np.arange(M), *args)
+    else:
+        n_workers = getattr(executor, "_max_workers", None) or os.cpu_count()
+        chunks = np.array_split(np.arange(M), min(M, 4 * n_workers))
+        with _shared_block(values) as values_name, _shared_block(L) as L_name:
+            futures = [
+                executor.submit(
+                    _network_worker,
+                    (values_name, L_name),
+                    (values.shape, L.shape),
+                    targets,
+                    *args,
+                )
+                for targets in chunks
+            ]
+            chunks = [
+                future.result()
+                for future in tqdm(futures, desc="Network GC", leave=False)
+            ]
+        W = np.concatenate([chunk[0] for chunk in chunks], axis=1)
+        dfd = np.concatenate([chunk[1] for chunk in chunks], axis=1)
+
+    p_value = stats.f.sf(W, maxlag, dfd)
+    return (
+        pd.DataFrame(W, index=df.columns, columns=df.columns),
+        pd.DataFrame(p_value, index=df.columns, columns=df.columns),
+    )
+
+
+# ################################################################################
+# BOOTSTRAP - (block) bootstrap of the DH test under the null, all entities at once
+# ################################################################################
+
+
+def _null_bases(padded, n, k_restricted):
+    """
+    Orthonormal bases of the unrestricted and restricted designs and the restricted
+    residuals (null of no Granger causality) of zero-padded augmented designs.
+    Rank deficient designs get their bases from an SVD (pseudo-inverse projection).
+    """
+    p = padded.shape[-1] - 1
+    Q, R = np.linalg.qr(padded)
+    Q_full, Q_own = Q[..., :p].copy(), Q[..., :k_restricted].copy()
+    for c in np.flatnonzero(_first_dependent_column(R) < p):
+        X = padded[c, : n[c], :-1]
+        for _Q, _X in [(Q_full, X), (Q_own, X[:, :k_restricted])]:
+            U, sv, _ = np.linalg.svd(_X, full_matrices=False)
+            rank = (sv > sv.max() * max(_X.shape) * np.finfo(float).eps).sum()
+            _Q[c] = 0.0
+            _Q[c, : n[c], :rank] = U[:, :rank]
+
+    y = padded[..., -1]
+    resid = y - np.einsum("cnk,ck->cn", Q_own, np.einsum("cnk,cn->ck", Q_own, y))
+    # extra zero residual at the end, where the padding rows point to
+    resid = np.concatenate([resid, np.zeros((len(n), 1))], axis=1)
+    return Q_full, Q_own, resid
+
+
+def _block_indices(u, n, block_length):
+    """
+    Bootstrap row indices (replications x entities x max(n)) from the common
+    uniform draws u (replications x blocks): block j of entity c starts at row
+    floor(u[:, j] * (n_c - L + 1)). Entities share the draws, so balanced panels
+    get the same time periods for every entity (cross-sectional dependence is kept).
+    Padding rows point to index max(n).
+    """
+    L = np.minimum(block_length, n)[:, None]
+    t = np.arange(n.max())[None, :]
+    starts = np.floor(u[:, t // L] * (n[:, None] - L + 1)).astype(int)
+    return np.where(t < n[:, None], starts + t % L, n.max())
+
+
+def _bootstrap_W(
+    block, offsets, K, single_lag, B, block_length, n_blocks, entropy, addconst=True
+):
+    """
+    Individual W's (entities x B) of B bootstrap samples under the null.
+    Fixed design residual bootstrap: y* = fitted restricted part + resampled
+    restricted residuals, so the factorized designs are reused for every replication
+    and only the projections of the resampled residuals are needed:
+    SSR* = |e*|^2 - |Q'e*|^2 for both the restricted and unrestricted basis.
+    The draws only depend on 'entropy' (not on how the entities are chunked).
+    """
+    N = len(offsets) - 1
+    W_star = np.full((N, B), np.nan)
+    u = np.random.default_rng(entropy).random((B, n_blocks))
+
+    for maxlag, group, _block, _offsets in _lag_groups(block, offsets, K):
+        lags = _gc_lags(maxlag, single_lag)
+        k_restricted = len(lags) + int(addconst)
+        n_exog = 2 * len(lags) + int(addconst)
+
+        Z, valid = _lag_design(_block, _offsets, lags, addconst)
+        feasible = np.flatnonzero(_complete_rows(valid, _offsets) > n_exog)
+        for chunk, _n, padded in _padded_chunks(Z, valid, _offsets, feasible):
+            Q_full, Q_own, resid = _null_bases(padded, _n, k_restricted)
+            # n - rank as for the observed W (rank deficient bases have zero columns)
+            dfd = _n - (np.abs(Q_full).max(axis=1) > 0).sum(axis=-1)
+
+            # replications in batches, keeping (batch x entities x rows) bounded
+            batch = max(1, _BATCH_MAX_CELLS // padded[..., 0].size)
+            for b in range(0, B, batch):
+                rows = _block_indices(u[b : b + batch], _n, block_length)
+                e_star = np.take_along_axis(resid[None], rows, axis=2)
+                ssq_full = (np.einsum("cnk,bcn->bck", Q_full, e_star) ** 2).sum(-1)
+                ssq_own = (np.einsum("cnk,bcn->bck", Q_own, e_star) ** 2).sum(-1)
+                ssr_full = (e_star**2).sum(-1) - ssq_full
+                W = (ssq_full - ssq_own) / ssr_full / maxlag * dfd
+                W_star[group[chunk], b : b + batch] = W.T
+
+    return W_star
+
+
 class PanelGC(object):
     def __init__(
         self,
@@ -138,11 +1486,18 @@ class PanelGC(object):
         initiate_individual_results=False,
         unused_entity_warning=True,
         single_lag=False,
+        engine="statsmodels",
+        n_jobs=1,
+        executor=None,
     ):
         # INDEX RELATED
         # perform initial data check
         self._check_set_data(data, x, y, freq)
+        self._maxlag = maxlag
+        self._appended = []
         self._check_K(maxlag)
+        self._check_engine(engine)
+        self._check_parallel(n_jobs, executor)
         self.single_lag = single_lag
         self.minimum_flag = True
         self.W_i = np.zeros(self.N) * np.nan
@@ -199,6 +1554,7 @@ class PanelGC(object):
         x = data.columns[1] if not x else x
         # make sure first column is the 'y' column
         data = data[[y, x]]
+        self._yx_columns = [y, x]
 
         # uniformize the names of columns
         data.columns = ["y", "x"]
@@ -206,12 +1562,29 @@ class PanelGC(object):
         self.dta = data
 
     def _check_K(self, maxlag):
-        if isinstance(maxlag, (int, np.int32)):
+        """
+        maxlag can be
+        - an integer: same K for all entities
+        - an array (entity order) or a dict/pd.Series (indexed by entity): K_i
+        - a callable returning K_i from an entity's [y, x] values on its time grid
+          (see e.g. "information_criterion_lag")
+        """
+        if isinstance(maxlag, (int, np.integer)):
             self.K_i = np.ones(self.N) * maxlag
             self.K_i = self.K_i.astype(int)
+        elif callable(maxlag):
+            self.K_i = np.array(
+                [maxlag(self._entity_values(i)) for i in range(self.N)]
+            ).astype(int)
+        elif isinstance(maxlag, (dict, pd.Series)):
+            K = pd.Series(maxlag).reindex(self._entities)
+            if K.isna().any():
+                raise ValueError(
+                    f"No lag order provided for: {', '.join([str(x) for x in K.index[K.isna()]])}"
+                )
+            self.K_i = K.values.astype(int)
         else:
-            raise NotImplementedError("For now only allow integer (same K for all)")
-            # self.K_i = K
+            self.K_i = np.asarray(maxlag).astype(int)
 
         assert (
             len(self.K_i) == self.N
@@ -220,39 +1593,103 @@ class PanelGC(object):
         if not np.all(self.K_i >= 1):
             raise ValueError("maxlag must be a (list of) positive integer(s)")
 
-        self.lag_order = maxlag
+        self.lag_order = maxlag if isinstance(maxlag, (int, np.integer)) else self.K_i
 
-    def _perform_individual_gc(self):
-        for i, ent in tqdm(
-            enumerate(self._entities), desc="Individual GC", leave=False, total=self.N
-        ):
-            _temp = self.dta.loc[idx[ent, :], :]
+    def _check_engine(self, engine):
+        """
+        "statsmodels": one "my_grangercausality" call per entity
+        "numpy": all entities at once in batched numpy (see "_batched_gc")
+        """
+        if engine not in ["statsmodels", "numpy"]:
+            raise ValueError("engine must be either 'statsmodels' or 'numpy'")
+        self.engine = engine
 
-            _temp.index = [x[1] for x in _temp.index]
-            _temp = _temp.resample(
-                self.freq
-            ).last()  # WARNINGS - make sure all times are there between start,end
+    def _check_parallel(self, n_jobs, executor):
+        """
+        n_jobs: number of worker processes for the entity loop (-1: all cores),
+        executor: any concurrent.futures executor to use instead (left open)
+        """
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        if not isinstance(n_jobs, (int, np.integer)) or n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
+        self.n_jobs = n_jobs
+        self.executor = executor
 
-            try:
-                if self.single_lag:
-                    _max_lag = [self.K_i[i]]
-                else:
-                    _max_lag = self.K_i[i]
-                gc = my_grangercausality(_temp, maxlag=_max_lag)
-                self.gc_i[ent] = gc
-                self.W_i[i] = gc.W
-                self.T_i[i] = gc.T
-
-            except ValueError:
-                # print(ent)
-                self.gc_i[ent] = "Infeasible"
-                self.W_i[i] = np.nan
-                self.T_i[i] = np.nan  # will cause the mask to cancel this obs out
+    def _stack_entities(self):
+        """
+        Puts all entities on their own regular time grid (from their first to their
+        last date, like "resample(freq).last()") in one go and stacks them in a
+        single 2-D numpy block: entity i lives in rows offsets[i]:offsets[i + 1],
+        its grid starting at starts[i].
+        Entities share the grid of the whole panel unless the frequency makes
+        resample start at every entity's own first day (see "_entity_bins").
+        Computed once, afterwards every entity is just a view into the block.
+        """
+        if hasattr(self, "_block"):
+            return self._block, self._offsets, self._starts
+
+        if self._appended:
+            self.dta = pd.concat([self.dta] + self._appended).sort_index()
+            self._appended = []
+
+        _index = self.dta.index
+        ent = self._entities.get_indexer(_index.get_level_values(0))
+        # contiguous rows per entity (data is sorted)
+        row_offsets = np.searchsorted(ent, np.arange(self.N + 1))
+
+        # bin of each observation on the regular grid of its entity
+        bins, starts, ends = _entity_bins(
+            _index.get_level_values(1), row_offsets, self.freq
+        )
 
+        start_bin = bins[row_offsets[:-1]]
+        end_bin = bins[row_offsets[1:] - 1]
+        offsets = np.concatenate([[0], np.cumsum(end_bin - start_bin + 1)])
+
+        block = np.full((offsets[-1], 2), np.nan)
+        _fill_last(block, offsets[ent] + bins - start_bin[ent], self.dta.values)
+
+        self._block, self._offsets, self._starts = block, offsets, starts
+        self._ends = ends
+        return self._block, self._offsets, self._starts
+
+    def _entity_values(self, i):
+        """
+        [y, x] of the i-th entity on its regular time grid (a view into the block)
+        """
+        block, offsets, _ = self._stack_entities()
+        return block[offsets[i] : offsets[i + 1]]
+
+    def _entity_data(self, ent):
+        i = self._entities.get_loc(ent)
+        values = self._entity_values(i)
+        return pd.DataFrame(
+            values,
+            index=pd.date_range(self._starts[i], periods=len(values), freq=self.freq),
+            columns=["y", "x"],
+        )
+
+    def _perform_individual_gc(self):
+        block, offsets, starts = self._stack_entities()
+        _args = (block, offsets, starts, self.K_i, self.freq, self.single_lag)
+        if self.n_jobs == 1 and self.executor is None:
+            W, T, dfd = _individual_gc(*_args, self.engine)
+        else:
+            W, T, dfd = _parallel_gc(
+                *_args, self.engine, n_jobs=self.n_jobs, executor=self.executor
+            )
+
+        self.W_i = W
+        self.T_i = T
+        self.gc_i = MyGCResultsStore(
+            self._entities, W, dfd, T, self.K_i, self.single_lag, self._entity_data
+        )
         self._individual_results = True
 
     def _verify_minimum_condition(self):
         self.mask = self.T_i > 5 + 2 * self.K_i
+        self.minimum_flag = True
         if False in self.mask:
             self.minimum_flag = False
             if self._unused_warning:
@@ -274,22 +1711,14 @@ class PanelGC(object):
     @property
     def E_W_i_tilde(self):
         self._check_individual_results()
-        E_W_tilde_i = (
-            self.K_i * (self.T_i - 2 * self.K_i - 1) / (self.T_i - 2 * self.K_i - 3)
-        )
+        E_W_tilde_i = _E_W_tilde(self.K_i, self.T_i)
         # return E_W_tilde_i[self.mask]
         return np.where(self.mask, E_W_tilde_i, np.nan)
 
     @property
     def Var_W_i_tilde(self):
         self._check_individual_results()
-        Var_W_tilde_i = (
-            2
-            * self.K_i
-            * (self.T_i - 2 * self.K_i - 1) ** 2
-            * (self.T_i - self.K_i - 3)
-            / ((self.T_i - 2 * self.K_i - 3) ** 2 * (self.T_i - 2 * self.K_i - 5))
-        )
+        Var_W_tilde_i = _Var_W_tilde(self.K_i, self.T_i)
         # return Var_W_tilde_i[self.mask]
         return np.where(self.mask, Var_W_tilde_i, np.nan)
 
@@ -315,12 +1744,13 @@ class PanelGC(object):
     @property
     def E_W_i(self):
         "asymptotic one (T->inf, N->inf)"
-        return self.lag_order
+        self._check_individual_results()
+        return np.mean(self.K_i[self.mask])
 
     @property
     def Var_W_i(self):
         "asymptotic one (T->inf, N->inf)"
-        return 2 * self.lag_order
+        return 2 * self.E_W_i
 
     @property
     def Z_bar(self):
@@ -330,7 +1760,236 @@ class PanelGC(object):
         )
         return Z_bar
 
-    def DH_test(self, zbar=False):
+    # INCREMENTAL UPDATES
+    def _sufficient_statistics(self):
+        """
+        Per lag order: cross-products of the augmented design [y lags, const, x lags, y]
+        of its entities (complete rows only), plus the last K periods of every
+        entity on its grid, which is all that is needed to add new periods
+        """
+        if hasattr(self, "_crossprod"):
+            return
+        block, offsets, _ = self._stack_entities()
+
+        self._crossprod = {}
+        self._group_pos = np.zeros(self.N, dtype=int)
+        for maxlag, group, _block, _offsets in _lag_groups(block, offsets, self.K_i):
+            Z, valid = _lag_design(_block, _offsets, _gc_lags(maxlag, self.single_lag))
+            self._crossprod[maxlag] = _crossprod(Z, valid, _offsets)
+            self._group_pos[group] = np.arange(len(group))
+
+        K_max = int(self.K_i.max())
+        rows = offsets[1:, None] - K_max + np.arange(K_max)
+        self._tails = np.full((self.N, K_max, 2), np.nan)
+        self._tails[rows >= offsets[:-1, None]] = block[
+            rows[rows >= offsets[:-1, None]]
+        ]
+
+    def _prepare_new_rows(self, new_rows):
+        """
+        New rows in the (entity, time) layout and [y, x] columns of self.dta
+        """
+        _index = new_rows.index
+        if (not isinstance(_index, pd.MultiIndex)) | (len(_index.names) != 2):
+            raise ValueError("Data must have a MultiIndex of size 2 (Entity-time)")
+        if isinstance(_index.levels[0], pd.DatetimeIndex):
+            new_rows = new_rows.swaplevel()
+        new_rows = new_rows[self._yx_columns].sort_index()
+        new_rows.columns = ["y", "x"]
+        new_rows.index.names = self.dta.index.names
+        return new_rows
+
+    def _full_recompute(self, new_rows):
+        """
+        Starts over with the new rows added to the data, the individual tests are
+        redone (lazily) at the next DH test
+        """
+        data = pd.concat([self.dta] + self._appended + [new_rows])
+        data.columns = self._yx_columns
+        self._appended = []
+        self._check_set_data(data, self._yx_columns[1], self._yx_columns[0], self.freq)
+        # before "_check_K": a callable maxlag reads the (new) stacked block
+        for attr in ["_block", "_offsets", "_starts", "_ends", "_crossprod", "_tails"]:
+            self.__dict__.pop(attr, None)
+        self._check_K(self._maxlag)
+
+        self.minimum_flag = True
+        self.W_i = np.zeros(self.N) * np.nan
+        self.T_i = np.zeros(self.N) * np.nan
+        self.gc_i = {}
+        self._individual_results = False
+
+    def append(self, new_rows):
+        """
+        Adds new periods (same layout and columns as the original data) and updates
+        W_i, T_i (and so DH_test()) by adding the new complete rows to the per-entity
+        cross-products, only touching the new rows and the last K periods of every
+        entity: O(N K^2) instead of redoing all the regressions.
+        Falls back to a full recompute when new rows do not come after an entity's
+        last period (e.g. filling in a missing value within the lag window, which
+        changes rows already used), bring in new entities or when the entities do
+        not share one grid (see "_common_grid").
+        """
+        new_rows = self._prepare_new_rows(new_rows)
+        _index = new_rows.index
+        ent = self._entities.get_indexer(_index.get_level_values(0))
+        if (
+            (not self._individual_results)
+            or np.any(ent < 0)
+            or not _common_grid(self.freq)
+        ):
+            return self._full_recompute(new_rows)
+
+        self._sufficient_statistics()
+        times = _index.get_level_values(1)
+        all_times = self._times.union(times.unique())
+        grid = _regular_grid(all_times, self.freq)
+        bins = _grid_bins(grid, times, self.freq)
+        end_bin = _grid_bins(grid, self._ends, self.freq)
+        if np.any(bins <= end_bin[ent]):
+            return self._full_recompute(new_rows)
+
+        # extension of every affected entity: its last K periods + the new ones
+        affected = np.unique(ent)
+        K_max = self._tails.shape[1]
+        new_end_bin = end_bin.copy()
+        np.maximum.at(new_end_bin, ent, bins)
+        lengths = K_max + new_end_bin[affected] - end_bin[affected]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        slot = np.full(self.N, -1)
+        slot[affected] = np.arange(len(affected))
+
+        ext = np.full((offsets[-1], 2), np.nan)
+        tail_rows = _segment_rows(offsets[:-1], np.full(len(affected), K_max))
+        ext[tail_rows] = self._tails[affected].reshape(-1, 2)
+        target = offsets[slot[ent]] + K_max + bins - end_bin[ent] - 1
+        _fill_last(ext, target, new_rows.values)
+
+        pos = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        K = self.K_i[affected]
+        for maxlag, group, _ext, _offsets in _lag_groups(ext, offsets, K):
+            Z, valid = _lag_design(_ext, _offsets, _gc_lags(maxlag, self.single_lag))
+            _pos = pos[_segment_rows(offsets[group], lengths[group])]
+            new = valid & (_pos >= K_max)
+            _ent = np.repeat(affected[group], lengths[group])[new]
+            _add_outer(self._crossprod[maxlag], self._group_pos[_ent], Z[new])
+
+        self._tails[affected] = ext[offsets[1:, None] - K_max + np.arange(K_max)]
+        self._ends[affected] = grid[new_end_bin[affected]].values
+        self._times = all_times
+        self.T = len(self._times)
+        self._appended.append(new_rows)
+        for attr in ["_block", "_offsets", "_starts"]:
+            self.__dict__.pop(attr, None)
+
+        self._update_from_crossprod(affected)
+
+    def _update_from_crossprod(self, entities):
+        for maxlag in np.unique(self.K_i[entities]):
+            ents = entities[self.K_i[entities] == maxlag]
+            C = self._crossprod[maxlag][self._group_pos[ents]]
+            W, T, dfd, _ = _gc_from_crossprod(C, maxlag, self.single_lag)
+            self.W_i[ents] = W
+            self.T_i[ents] = T
+            self.gc_i.update_entities(ents, W, dfd, T)
+
+    def rolling(self, window, step=1):
+        """
+        DH test over rolling windows of 'window' periods (of freq), sliding by
+        'step' periods. Every slide only adds/drops the rows entering/leaving the
+        window to the per-entity cross-products instead of building a new panel.
+        Returns a DataFrame indexed by the last period of every window with W_bar,
+        Z_bar_tilde, p_value and N_masked. Entity-windows with a perfect fit (e.g.
+        a stale stretch of y) are left out, like entities with too few periods.
+        """
+        if window <= 5 + 2 * self.K_i.max():
+            raise ValueError(
+                f"Window must be longer than 5 + 2K = {5 + 2 * self.K_i.max()} periods"
+            )
+        if not _common_grid(self.freq):
+            raise ValueError(
+                f"With freq {self.freq} every entity's grid starts at its own first "
+                "day, rolling windows need one grid for all (e.g. D, h, W or ME)"
+            )
+        block, offsets, starts = self._stack_entities()
+        grid = _regular_grid(self._times, self.freq)
+
+        W = np.full(self.N, np.nan)
+        T = np.full(self.N, np.nan)
+        ends, rows = [], []
+        for end, groups in _rolling_crossprod(
+            block,
+            offsets,
+            grid.get_indexer(starts),
+            self.K_i,
+            window,
+            step,
+            self.single_lag,
+        ):
+            for maxlag, group, C in groups:
+                W[group], T[group], _, _ = _gc_from_crossprod(
+                    C, maxlag, self.single_lag, raise_perfect_fit=False
+                )
+            ends.append(end)
+            rows.append(_dh_statistics(W, T, self.K_i))
+        return pd.DataFrame(rows, index=grid[ends])
+
+    def lag_sweep(self, max_lag=None):
+        """
+        Individual W's and DH test for every lag order K = 1..max_lag (default: the
+        (largest) lag order of the test) in a single pass over the panel, e.g. for lag selection.
+        Per entity, all K use the sample of max_lag (see "_batched_lag_sweep").
+        Stores the individual W's in W_iK (N x max_lag) and T's in T_iK,
+        returns the DH statistics per lag order.
+        """
+        max_lag = int(self.K_i.max()) if max_lag is None else max_lag
+        block, offsets, _ = self._stack_entities()
+        self.W_iK, self.T_iK, _, _ = _batched_lag_sweep(block, offsets, max_lag)
+
+        K = np.arange(1, max_lag + 1)
+        results = _dh_statistics(self.W_iK, self.T_iK[:, None], K[None, :])
+        return pd.DataFrame(results, index=pd.Index(K, name="lag_order"))
+
+    def bootstrap_Z_bar_tilde(self, B=999, block_length=1, seed=None):
+        """
+        Bootstrap distribution (B replications) of Z_bar_tilde under the null of no
+        Granger causality: restricted residuals get resampled in blocks of
+        'block_length' periods, with the same draws for all entities to keep the
+        cross-sectional dependence (block_length=1 resamples whole periods, like
+        "xtgcause"). Runs on the process pool when n_jobs/executor is set, results
+        only depend on the seed. The individual W's are kept in W_i_star (N x B).
+        """
+        self._check_individual_results()
+        block, offsets, _ = self._stack_entities()
+        n_blocks = int(np.ceil(np.diff(offsets).max() / block_length))
+        entropy = np.random.SeedSequence(seed).entropy
+        args = (self.single_lag, B, block_length, n_blocks, entropy)
+
+        if self.n_jobs == 1 and self.executor is None:
+            W_star = _bootstrap_W(block, offsets, self.K_i, *args)
+        else:
+            W_star = np.concatenate(
+                _map_entity_chunks(
+                    _bootstrap_W,
+                    block,
+                    offsets,
+                    (self.K_i,),
+                    args,
+                    self.n_jobs,
+                    self.executor,
+                    desc="Bootstrap DH",
+                )
+            )
+        self.W_i_star = W_star
+        return _dh_statistics(W_star, self.T_i[:, None], self.K_i[:, None])[
+            "Z_bar_tilde"
+        ]
+
+    def DH_test(self, zbar=False, bootstrap=None, block_length=1, seed=None):
+        """
+        bootstrap: number of bootstrap replications for a (block) bootstrap p-value
+        on top of the asymptotic one (see "bootstrap_Z_bar_tilde")
+        """
         results_dic = {
             "W_bar": self.W_bar,
             "Z_bar_tilde": self.Z_bar_tilde,
@@ -340,6 +1999,11 @@ class PanelGC(object):
         }
         if zbar:
             results_dic["Z_bar"] = self.Z_bar
+        if bootstrap:
+            Z_star = self.bootstrap_Z_bar_tilde(bootstrap, block_length, seed)
+            results_dic["p_value_bootstrap"] = (
+                1 + np.sum(Z_star >= results_dic["Z_bar_tilde"])
+            ) / (bootstrap + 1)
         if not self.minimum_flag:
             results_dic["N_masked"] = self.N_masked
             results_dic["Entities_unused"] = [x for x in self._entities[~self.mask]]
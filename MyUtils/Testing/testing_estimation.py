@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from MyUtils.estimation.ornstein_uhlenbeck import (
+    loglikelihood_vasicek,
+    loglikelihood_vasicek_grad,
+)
+from MyUtils.simulation import ornstein_uhlenbeck
+
+# =============================================================================
+# VASICEK LIKELIHOOD - data layouts
+# =============================================================================
+# series in the columns (T x n_series), a single column or row being one series
+
+
+class TestVasicekLayout(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.X = ornstein_uhlenbeck.univariate(0.3, 0.2, 1.0, 0.5, 500, 3)
+        self.param = np.array([0.25, 0.9, 0.45])
+
+    def test_single_series(self):
+        x = self.X[:, 0]
+        ll = loglikelihood_vasicek(self.param, x)
+        grad = loglikelihood_vasicek_grad(self.param, x)
+        for data in [x[:, None], x[None, :]]:
+            self.assertAlmostEqual(loglikelihood_vasicek(self.param, data), ll)
+            np.testing.assert_allclose(
+                loglikelihood_vasicek_grad(self.param, data), grad
+            )
+
+    def test_panel(self):
+        ll = loglikelihood_vasicek(self.param, self.X)
+        self.assertEqual(ll.shape, (3,))
+        for j in range(3):
+            self.assertAlmostEqual(
+                ll[j], loglikelihood_vasicek(self.param, self.X[:, j])
+            )
+
+    def test_too_short(self):
+        with self.assertRaises(ValueError):
+            loglikelihood_vasicek(self.param, np.ones((1, 1)))
+        with self.assertRaises(ValueError):
+            loglikelihood_vasicek(self.param, self.X[0, :1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from MyUtils.PanelGC import (
+    PanelGC,
+    _crossprod,
+    _gc_from_crossprod,
+    _gc_lags,
+    _lag_design,
+    grangercausality_lag_sweep,
+    information_criterion_lag,
+    my_grangercausality,
+    network_grangercausality,
+)
+from MyUtils.simulation.panel import unbalanced_panel
+
+# =============================================================================
+# NUMPY ENGINES VS STATSMODELS - rank deficient designs
+# =============================================================================
+# x alternating +-3 makes its lags collinear (x_t-2 = -x_t-1): statsmodels
+# falls back to the pseudo-inverse and uses n - rank degrees of freedom
+
+
+def alternating_x(n=175, seed=0):
+    rng = np.random.default_rng(seed)
+    x = 3.0 * (-1) ** np.arange(n)
+    y = rng.standard_normal(n) + 0.1 * np.roll(x, 1)
+    return pd.DataFrame(
+        {"y": y, "x": x}, index=pd.date_range("2020-01-01", periods=n, freq="D")
+    )
+
+
+class TestRankDeficient(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore")
+        self.df = alternating_x()
+
+    def test_lean(self):
+        for K in [2, 3]:
+            ref = my_grangercausality(self.df, K)
+            res = my_grangercausality(self.df, K, lean=True)
+            self.assertEqual(res.dfd, ref.dfd)
+            self.assertAlmostEqual(res.W, ref.W, places=8)
+
+    def test_crossprod(self):
+        values = self.df.values
+        offsets = np.array([0, len(values)])
+        for K in [2, 3]:
+            ref = my_grangercausality(self.df, K)
+            Z, valid = _lag_design(values, offsets, _gc_lags(K, False))
+            W, _, dfd, _ = _gc_from_crossprod(_crossprod(Z, valid, offsets), K)
+            self.assertEqual(dfd[0], ref.dfd)
+            self.assertAlmostEqual(W[0], ref.W, places=8)
+
+    def test_lag_sweep(self):
+        # the largest lag order uses the same sample as the single test
+        ref = my_grangercausality(self.df, 3)
+        res = grangercausality_lag_sweep(self.df, 3).loc[3]
+        self.assertEqual(res["dfd"], ref.dfd)
+        self.assertAlmostEqual(res["W"], ref.W, places=8)
+
+    def test_network(self):
+        net = self.df.rename(columns={"y": "a", "x": "b"})
+        W, _ = network_grangercausality(net, 2)
+        self.assertAlmostEqual(W.loc["b", "a"], my_grangercausality(net, 2).W, 8)
+
+    def test_panel_engines(self):
+        panel = unbalanced_panel(5, 200, 2, seed=0)
+        entity = panel.index.get_level_values(0) == "entity_1"
+        panel.loc[entity, "x"] = 3.0 * (-1) ** np.arange(entity.sum())
+
+        results = {}
+        for engine in ["statsmodels", "numpy"]:
+            pg = PanelGC(panel, 2, freq="D", engine=engine, unused_entity_warning=False)
+            pg.DH_test()
+            results[engine] = pg.W_i, pg.gc_i.dfd
+        np.testing.assert_allclose(results["numpy"][0], results["statsmodels"][0])
+        np.testing.assert_array_equal(results["numpy"][1], results["statsmodels"][1])
+
+
+# =============================================================================
+# APPEND - new entities with a callable maxlag
+# =============================================================================
+
+
+class TestAppend(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore")
+        self.panel = unbalanced_panel(7, 200, 2, seed=1)
+        self.new = self.panel.index.get_level_values(0) == "entity_5"
+        self.maxlag = information_criterion_lag(3)
+        self.ref = self.fresh(self.panel)
+        self.ref.DH_test()
+
+    def fresh(self, data):
+        return PanelGC(
+            data, self.maxlag, freq="D", engine="numpy", unused_entity_warning=False
+        )
+
+    def check(self, pg):
+        pg.DH_test()
+        np.testing.assert_array_equal(pg.K_i, self.ref.K_i)
+        np.testing.assert_allclose(pg.W_i, self.ref.W_i)
+
+    def test_new_entity_after_DH_test(self):
+        pg = self.fresh(self.panel[~self.new])
+        pg.DH_test()
+        pg.append(self.panel[self.new])
+        self.check(pg)
+
+    def test_new_entity_before_DH_test(self):
+        pg = self.fresh(self.panel[~self.new])
+        pg.append(self.panel[self.new])
+        self.check(pg)
+
+
+if __name__ == "__main__":
+    unittest.main()
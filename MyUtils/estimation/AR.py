@@ -0,0 +1,126 @@
+# =============================================================================
+# Packages
+# =============================================================================
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+# Gaussian AR(p): y_t = a + b_1 y_t-1 + ... + b_p y_t-p + e_t, e_t ~ N(0, sigma_e^2)
+# parameters as [a, b_1, ..., b_p, sigma_e], conditional on the first p
+# observations
+
+
+def lag_matrix(data, p):
+    """
+    Returns y_t (T - p) and the lag matrix [y_t-1, ..., y_t-p] (T - p x p) of a
+    series, both (zero-copy) views on the data
+    """
+    windows = sliding_window_view(np.asarray(data, dtype=float).reshape(-1), p + 1)
+    return windows[:, -1], windows[:, -2::-1]
+
+
+CrossProducts = namedtuple("CrossProducts", ["C", "mean"])
+
+
+def crossproducts(data, p):
+    """
+    Z'Z of Z = [1, y_t-1, ..., y_t-p, y_t] of the demeaned series, which is all
+    the likelihood needs, and the mean. Built from dot products of shifted slices
+    of the series, without forming Z.
+    Can be passed instead of the data to "loglikelihood" and
+    "loglikelihood_grad", which then cost O(p^2) per evaluation, e.g.
+    fit(loglikelihood, loglikelihood_grad, x0, crossproducts(data, p)).
+    """
+    data = np.asarray(data, dtype=float).reshape(-1)
+    mean = data.mean()
+    z = data - mean
+    T = len(z)
+    columns = [z[p - k : T - k] for k in range(1, p + 1)] + [z[p:]]
+
+    C = np.empty((p + 2, p + 2))
+    C[0, 0] = T - p
+    for i, column in enumerate(columns, start=1):
+        C[0, i] = C[i, 0] = column.sum()
+        for j in range(i, p + 2):
+            C[i, j] = C[j, i] = column @ columns[j - 1]
+    return CrossProducts(C, mean)
+
+
+def _crossproducts(data, p):
+    if isinstance(data, CrossProducts):
+        if data.C.shape[0] != p + 2:
+            raise ValueError(f"Cross-products are not those of an AR({p})")
+        return data
+    return crossproducts(data, p)
+
+
+def _residual_weights(param, mean):
+    """
+    e_t = w'z_t for z_t = [1, y_t-1, ..., y_t-p, y_t] of the demeaned series, for
+    (a batch of) parameters: w = [-(a - mean (1 - sum b)), -b, 1]
+    """
+    param = np.asarray(param, dtype=float)
+    a, b = param[..., 0], param[..., 1:-1]
+    a_demeaned = a - mean * (1 - b.sum(axis=-1))
+    return np.concatenate(
+        [-a_demeaned[..., None], -b, np.ones(param.shape[:-1] + (1,))], axis=-1)
+
+
+def conditional_ml(data, p):
+    """
+    Closed-form conditional maximum likelihood estimates [a, b_1, ..., b_p,
+    sigma_e] of a Gaussian AR(p) (least squares on the lag matrix)
+    """
+    y_t, lags = lag_matrix(data, p)
+    X = np.column_stack([np.ones(len(y_t)), lags])
+    beta = np.linalg.lstsq(X, y_t, rcond=None)[0]
+    errors = y_t - X @ beta
+    sigma_e = np.sqrt(errors @ errors / len(y_t))
+    return np.concatenate([beta, [sigma_e]])
+
+
+def loglikelihood(param, data):
+    """
+    Conditional loglikelihood of a Gaussian AR(p) for parameters [a, b_1, ...,
+    b_p, sigma_e] or a batch of them (n_params x p + 2, giving n_params values),
+    the sum of squared errors being a quadratic form in the cross-products.
+    data is the series or its "crossproducts".
+    """
+    param = np.asarray(param, dtype=float)
+    p = param.shape[-1] - 2
+    C, mean = _crossproducts(data, p)
+    T = C[0, 0]
+
+    w = _residual_weights(param, mean)
+    ssr = np.einsum('...i,ij,...j->...', w, C, w)
+    sigma_e = param[..., -1]
+
+    return (- T / 2 * np.log(2 * np.pi * sigma_e**2)
+            - 1 / 2 * ssr / sigma_e**2)
+
+
+def loglikelihood_grad(param, data):
+    """
+    Score (gradient of "loglikelihood" to [a, b_1, ..., b_p, sigma_e]), also for
+    a batch of parameters. data is the series or its "crossproducts".
+    """
+    param = np.asarray(param, dtype=float)
+    p = param.shape[-1] - 2
+    C, mean = _crossproducts(data, p)
+    T = C[0, 0]
+
+    w = _residual_weights(param, mean)
+    # sum of e_t times [1, demeaned lags]
+    e_z = w @ C[:, :-1]
+    ssr = np.einsum('...i,ij,...j->...', w, C, w)
+    sigma_e = param[..., -1]
+
+    d_a = e_z[..., 0] / sigma_e**2
+    d_b = (e_z[..., 1:] + mean * e_z[..., :1]) / sigma_e[..., None]**2
+    d_sigma = -T / sigma_e + ssr / sigma_e**3
+
+    return np.concatenate([d_a[..., None], d_b, d_sigma[..., None]], axis=-1)
@@ -1,5 +1,6 @@
 __author__ = 'jordy'
 
+import MyUtils.estimation.AR
 import MyUtils.estimation.normal
 import MyUtils.estimation.OLS
 import MyUtils.estimation.general
@@ -2,6 +2,7 @@
 # Packages
 # =============================================================================
 import numpy as np
+from scipy.optimize import minimize
 
 # =============================================================================
 # FUNCTIONS
@@ -59,3 +60,22 @@ def MAPE(estimated_param, actual_param):
     Mean Absolute Percentage Error
     """
     return np.mean(np.abs((actual_param - estimated_param) / actual_param), axis=0)
+
+
+def fit(loglikelihood, gradient, x0, *args, bounds=None, **options):
+    """
+    Maximum likelihood estimation with L-BFGS(-B), using the analytic score
+    'gradient' instead of finite differences, e.g.
+    fit(loglikelihood_vasicek, loglikelihood_vasicek_grad, x0, data).
+    Both are called as f(param, *args), loglikelihoods returning a tuple (like the
+    VAR ones, which also return Sigma_U) only have their first element used.
+    Returns the scipy OptimizeResult ('x' holding the estimates).
+    """
+    def negative_loglikelihood(param):
+        ll = loglikelihood(param, *args)
+        if isinstance(ll, tuple):
+            ll = ll[0]
+        return -ll, -gradient(param, *args)
+
+    return minimize(negative_loglikelihood, x0, jac=True, method='L-BFGS-B',
+                    bounds=bounds, options=options)
@@ -10,6 +10,8 @@ Created on Tue Jul 31 15:43:04 2018
 import numpy as np
 import scipy.stats as scs
 
+from MyUtils.estimation import AR
+
 # =============================================================================
 # FUNCTIONS
 # =============================================================================
@@ -33,22 +35,7 @@ def ci(mean, sigma_squared, n, alpha=0.05):
 def loglikelihood_AR1(param, t):
     """
     Computes the loglikelihood for a Gaussian AR(1) process, given data and
-    the suggested parameters
+    the suggested parameters (conditional on the first observation, see
+    "AR.loglikelihood", t can also be "AR.crossproducts(t, 1)")
     """
-    t = t.reshape(-1)
-    y_1 = t[0]
-    y_t = t[1:]
-    y_tm1 = t[:-1]
-
-    a, b, sigma_e = param
-    T = len(t)
-
-    ll_1 = (- 1 / 2 * np.log(2 * np.pi)
-            - 1 / 2 * np.log(sigma_e**2 / (1 - b**2))
-            - 1 / 2 * ((y_1 - a / (1 - b))**2 / (sigma_e**2 / (1 - b**2))))
-
-    ll_1 = 0
-    ll_t = (- (T - 1) / 2 * np.log(2 * np.pi * sigma_e**2)
-            - 1 / 2 * np.sum((y_t - a - b * y_tm1)**2 / sigma_e**2))
-
-    return ll_1 + ll_t
+    return AR.loglikelihood(param, t)
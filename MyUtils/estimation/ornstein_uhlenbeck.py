@@ -4,40 +4,107 @@
 import numpy as np
 import pandas as pd
 
+from MyUtils.estimation import AR
+from MyUtils.vector import devec, operators, vec
+
 # =============================================================================
 # UNIVARIATE
 # =============================================================================
 
 
+def vasicek_transition(param, de=1):
+    """
+    Constants of the Vasicek transition density per parameter row [kappa, theta,
+    sigma] (param being (3) or (n_params x 3)): x_t | x_t-de is normal with mean
+    theta + (x_t-de - theta) b and variance v, b = exp(-kappa de).
+    Returns kappa, theta, sigma, b and v
+    """
+    param = np.asarray(param, dtype=float)
+    kappa, theta, sigma = param[..., 0], param[..., 1], param[..., 2]
+    b = np.exp(-kappa * de)
+    v = -sigma**2 / (2 * kappa) * np.expm1(-2 * kappa * de)
+    return kappa, theta, sigma, b, v
+
+
 def closed_form_observational_ll_univariate(x, x0, de, param):
     """
     Function computes the logdensity for the Vasicek model.
-    Function is written in this form, with the purpose that 
+    Function is written in this form, with the purpose that
     it can be used in the already written structure of Ait-Sahalia
+    (computed in log-space, so it does not underflow far in the tails)
     """
-    kappa = param[0]
-    theta = param[1]
-    sigma = param[2]
-
-    output = ((2 * np.pi)**(-1 / 2)
-              * (sigma**2 / (2 * kappa) * (1 - np.exp(-2 * kappa * de)))**(-1 / 2)
-              * np.exp(-(x - theta - (x0 - theta) * np.exp(-kappa * de))**2
-                       / (2 * sigma**2 / (2 * kappa) * (1 - np.exp(-2 * kappa * de)))))
+    _, theta, _, b, v = vasicek_transition(param, de)
 
-    return np.log(output)
+    return (-1 / 2 * np.log(2 * np.pi * v)
+            - (x - theta - (x0 - theta) * b)**2 / (2 * v))
 
 
-def loglikelihood_vasicek(param, data):
+def _vasicek_residual_sums(param, data, de=1):
+    """
+    Sums of the residuals r_t = x_t - theta - (x_t-de - theta) b of the Vasicek
+    transition density, for a single series (T) or one series per column (T x
+    n_series) and a parameter row (3) or grid (n_params x 3), broadcasting to
+    (n_params x n_series). A single column or row counts as a single series.
+    Returns n, sum r, sum r (x_t-de - theta), sum r^2 and the transition
+    constants (kappa, theta, sigma, b, v) of "vasicek_transition"
+    """
+    data = np.asarray(data, dtype=float)
+    if data.ndim == 2 and 1 in data.shape:
+        data = data.reshape(-1)
+    if data.shape[0] < 2:
+        raise ValueError(
+            "Every series needs at least 2 observations (series in the columns)")
+    kappa, theta, sigma, b, v = vasicek_transition(param, de)
+    if data.ndim == 2 and np.ndim(theta) == 1:
+        kappa, theta, sigma, b, v = (
+            y[:, None] for y in (kappa, theta, sigma, b, v))
+
+    # residuals are unchanged by demeaning both the series and theta
+    mean = data.mean(axis=0)
+    n, S_x, S_y, S_xx, S_xy, S_yy = ou_sufficient_sums(data - mean)
+    theta_d = theta - mean
+    c = theta_d * (1 - b)
+
+    S_r = S_y - b * S_x - n * c
+    S_rx = S_xy - b * S_xx - c * S_x - theta_d * S_r
+    S_rr = (S_yy - 2 * b * S_xy - 2 * c * S_y + b**2 * S_xx + 2 * b * c * S_x
+            + n * c**2)
+    return n, S_r, S_rx, S_rr, (kappa, theta, sigma, b, v)
+
+
+def loglikelihood_vasicek(param, data, de=1):
     """
     Given a dataset, this function computes the loglikelihood of the parameters
-    on this dataset
+    on this dataset.
+    Broadcasts over a grid of parameters (n_params x 3) and a panel of series
+    (T x n_series, one series per column), giving an (n_params x n_series)
+    array: the sum of squared residuals of every parameter row follows from the
+    sufficient sums of the (demeaned) series, so the cost does not grow with T
+    per parameter row.
     """
-    data = data.reshape(-1)
+    n, _, _, S_rr, (_, _, _, _, v) = _vasicek_residual_sums(param, data, de)
+    return -n / 2 * np.log(2 * np.pi * v) - S_rr / (2 * v)
+
 
-    x_0 = data[:-1]
-    x = data[1:]
+def loglikelihood_vasicek_grad(param, data, de=1):
+    """
+    Score (gradient of "loglikelihood_vasicek" to [kappa, theta, sigma]):
+    every x_t | x_t-de is normal with mean m = theta + (x_t-de - theta) b and
+    variance v = sigma^2 / (2 kappa) (1 - b^2), b = exp(-kappa de).
+    Same layout as "loglikelihood_vasicek", with [kappa, theta, sigma] last
+    """
+    n, S_r, S_rx, S_rr, (kappa, _, sigma, b, v) = _vasicek_residual_sums(
+        param, data, de)
 
-    return closed_form_observational_ll_univariate(x, x_0, 1, param).sum()
+    # derivatives of the loglikelihood to the variance
+    d_v = -n / (2 * v) + S_rr / (2 * v**2)
+
+    d_kappa = -de * b * S_rx / v + d_v * (sigma**2 * de * b**2 / kappa
+                                          - v / kappa)
+    d_theta = S_r * (1 - b) / v
+    d_sigma = d_v * 2 * v / sigma
+
+    return np.stack(np.broadcast_arrays(d_kappa, d_theta, d_sigma), axis=-1)
 
 
 def ou_param_from_lr_param(lr_param):
@@ -75,48 +142,33 @@ def lr_param_from_ou_param(param):
 def AR_p_ll(param, data):
     """
     Computes the loglikelihood of a Gaussian Autoregressive(p) process (AR(p))
+    (see "AR.loglikelihood", also takes a batch of parameters, and
+    "AR.crossproducts" of the data instead of the data for repeated evaluations)
     """
-    p = len(param) - 2
-    y_t = data[p:]
-    y_tmps = np.zeros((p, len(y_t)))
-    for i in range(p):
-        y_tmps[i] = data[p - i - 1: -i - 1]
-
-    # parameters
-    a = param[0]
-    b = param[1:p + 1]
-    sigma_e = param[-1]
-    T = len(y_t)
+    return AR.loglikelihood(param, data)
 
-    y_t_hat = a + b @ y_tmps  # estimates
 
-    errors = y_t - y_t_hat
-
-    ll = (- T / 2 * np.log(2 * np.pi * sigma_e**2)
-          - 1 / 2 * np.sum(errors**2 / sigma_e**2))
-
-    return ll
+def AR_p_ll_grad(param, data):
+    """
+    Score (gradient of "AR_p_ll" to [a, b_1, ..., b_p, sigma_e])
+    """
+    return AR.loglikelihood_grad(param, data)
 
 
-def ou_univariate_parameter_estimation_ML(x, delta=1):
+def ou_sufficient_sums(x):
     """
-    Analytical solution of the MLE estimation using the conditional probability
-    density function
+    Sufficient statistics of the conditional (AR(1)) likelihood of OU process(es)
+    observed in the columns of x (T x n_series): n, S_x, S_y, S_xx, S_xy, S_yy with
+    x the lagged and y the current observations, per column
     """
-    x = np.array([])
-    y = np.array([])
-    for i in t.T:
-        x = np.hstack((x, i[:-1]))
-        y = np.hstack((y, i[1:]))
-
-    S_x = x.sum()
-    S_y = y.sum()
-    S_xx = (x**2).sum()
-    S_xy = (x * y).sum()
-    S_yy = (y**2).sum()
+    x = np.asarray(x, dtype=float)
+    x_lag, y = x[:-1], x[1:]
+    n = np.full(x.shape[1:], x.shape[0] - 1, dtype=float)
+    return (n, x_lag.sum(axis=0), y.sum(axis=0), (x_lag**2).sum(axis=0),
+            (x_lag * y).sum(axis=0), (y**2).sum(axis=0))
 
-    n = t.shape[0] * t.shape[1] - t.shape[1]
 
+def _ou_ML_from_sums(n, S_x, S_y, S_xx, S_xy, S_yy, delta=1):
     theta = (S_y * S_xx - S_x * S_xy) / \
         (n * (S_xx - S_xy) - (S_x**2 - S_x * S_y))
     kappa = -1 / delta * np.log((S_xy - theta * S_x - theta * S_y + n * theta**2) /
@@ -133,6 +185,23 @@ def ou_univariate_parameter_estimation_ML(x, delta=1):
     return kappa, theta, sigma
 
 
+def ou_univariate_parameter_estimation_ML(x, delta=1, pooled=False):
+    """
+    Analytical solution of the MLE estimation using the conditional probability
+    density function.
+    x is a single series (T) or one series per column (T x n_series), giving
+    kappa, theta and sigma per series from their sufficient sums.
+    pooled=True also returns the (kappa, theta, sigma) of all series together
+    (assumed to share their parameters): (per series, pooled).
+    """
+    sums = ou_sufficient_sums(x)
+    per_series = _ou_ML_from_sums(*sums, delta=delta)
+    if not pooled:
+        return per_series
+
+    return per_series, _ou_ML_from_sums(*[S.sum() for S in sums], delta=delta)
+
+
 def mle_var_kappa(kappa_hat, de=1):
     """
     Maximum likelihood variance of kappa
@@ -167,92 +236,169 @@ def mle_var_sigma(kappa_hat, sigma_hat, de=1):
 # VAR(p)
 
 
+def _logdet_cholesky(Sigma):
+    """
+    log det of (stacks of) covariance matrices from the diagonal of their Cholesky
+    factor, nan for the ones that are not (numerically) positive definite
+    """
+    try:
+        L = np.linalg.cholesky(Sigma)
+    except np.linalg.LinAlgError:
+        k = Sigma.shape[-1]
+        _Sigma = Sigma.reshape(-1, k, k)
+        L = np.full_like(_Sigma, np.nan)
+        for i in range(len(_Sigma)):
+            try:
+                L[i] = np.linalg.cholesky(_Sigma[i])
+            except np.linalg.LinAlgError:
+                pass
+        L = L.reshape(Sigma.shape)
+    with np.errstate(divide="ignore"):
+        return 2 * np.log(np.diagonal(L, axis1=-2, axis2=-1)).sum(axis=-1)
+
+
+def concentrated_loglikelihood_gaussian(U):
+    """
+    Gaussian loglikelihood of (stacks of) kxT residuals U at their ML covariance
+    Sigma_U = UU'/T. Then tr(Sigma_U^-1 UU') = kT, so only log det(Sigma_U) is
+    needed (one Cholesky, no inverse). A singular Sigma_U (perfect fit) gives -inf,
+    so optimizers steer away from it.
+    Returns the loglikelihood(s) and Sigma_U
+    """
+    k, T = U.shape[-2:]
+    Sigma_U = U @ np.swapaxes(U, -1, -2) / T
+    logdet = _logdet_cholesky(Sigma_U)
+    ll = -k * T / 2 * np.log(2 * np.pi) - T / 2 * logdet - k * T / 2
+    return np.where(np.isfinite(logdet), ll, -np.inf)[()], Sigma_U
+
+
+def lagged_VARp(t, p):
+    """
+    Stacked lags [y_t-1, ..., y_t-p] (kp x T - p) of the kxT data t
+    """
+    T = t.shape[1]
+    return np.concatenate([t[:, p - j: T - j] for j in range(1, p + 1)], axis=0)
+
+
 def loglikelihood_gaussian_VARp(param, t):
     """
-    Computes the loglikelihood function of a k-factor Var(p) process given 
+    Computes the loglikelihood function of a k-factor Var(p) process given
     the parameters and the data.
     Based on 3.4.5 in Lutkepohl(2007)
-    parameters consists of an array with the first k elements being the 
-    estimates for mu (k process averages), remaining elements of the 
-    parameters array are the estimates for kxpk A matrix.
+    parameters consists of an array with the first k elements being the
+    estimates for mu (k process averages), remaining elements of the
+    parameters array are the estimates for kxpk A matrix [A_1, ..., A_p].
+    A batch of parameter arrays (n x k + pk^2) gives n loglikelihoods at once.
+    Uses the concentrated form (see "concentrated_loglikelihood_gaussian").
     """
+    param = np.asarray(param, dtype=float)
     k = t.shape[0]
-    p = int((len(param) - k) / k**2)
-    T = t.shape[1] - p  # first p observations are assumed known
+    p = int((param.shape[-1] - k) / k**2)
 
-    mu = devec(param[:k], (k, 1))
+    mu = param[..., :k, None]
+    A = devec(param[..., k:], (k, k * p))  # elements for A matrix
 
-    A_is = param[k:]  # elements for A matrix
+    # y_t - mu = sum_j A_j (y_t-j - mu) + u_t
+    Y0 = t[:, p:] - mu  # first p observations are assumed known
+    A_sum = sum(A[..., :, j * k: (j + 1) * k] for j in range(p))
+    U = Y0 - A @ lagged_VARp(t, p) + A_sum @ mu
 
-    A = devec(A_is, (k, k * p))
+    return concentrated_loglikelihood_gaussian(U)
 
-    Y = t[:, p:]  # all 'unknown' observations
+def _concentrated_score_U(U):
+    """
+    Derivative of "concentrated_loglikelihood_gaussian" to the residuals:
+    -T (UU')^-1 U = -Sigma_U^-1 U
+    """
+    T = U.shape[-1]
+    return -np.linalg.solve(U @ np.swapaxes(U, -1, -2) / T, U)
 
-    Y0 = np.subtract(Y, mu)
 
-    X = np.subtract(t[:, :-p], mu)
+def loglikelihood_gaussian_VARp_grad(param, t):
+    """
+    Score (gradient of "loglikelihood_gaussian_VARp" to [mu, vec(A)]), also for a
+    batch of parameter arrays. With S = Sigma_U^-1 U and X the lags minus mu:
+    d/dA = S X' and d/dmu = (I - sum_j A_j)' S 1
+    """
+    param = np.asarray(param, dtype=float)
+    k = t.shape[0]
+    p = int((param.shape[-1] - k) / k**2)
 
-    U = Y0 - A @ X
+    mu = param[..., :k, None]
+    A = devec(param[..., k:], (k, k * p))
 
-    sigma_U = U @ U.T / T
+    Y0 = t[:, p:] - mu
+    X = lagged_VARp(t, p) - np.concatenate([mu] * p, axis=-2)
+    U = Y0 - A @ X
 
-    # Note the pseudo inverse - after weeks of struggle, I found out that the
-    # normal inv and numba does not do well for 'big' numbers, giving
-    # completely wrong results after annealing. This is (hopefully) solved
-    # by using the pseudo-inv
-    ll = (- 1 / 2 * k * T * np.log(2 * np.pi)
-          - T / 2 * np.log(la.det(sigma_U))
-          - trace(U.T @ la.pinv(sigma_U) @ U))
+    S = -_concentrated_score_U(U)
+    A_sum = sum(A[..., :, j * k: (j + 1) * k] for j in range(p))
+    d_mu = np.swapaxes(np.eye(k) - A_sum, -1, -2) @ S.sum(axis=-1)[..., None]
+    d_A = S @ np.swapaxes(X, -1, -2)
 
-    return ll, sigma_U
+    return np.concatenate([d_mu[..., 0], vec(d_A)], axis=-1)
 
 ### Var(1) - restricted
 
 
 def param_to_mu_A1_restricted(parameters):
     """
-    Tranforms parameter array for an 2 factor Var(1) process, with the 
+    Tranforms parameter array for an 2 factor Var(1) process, with the
     restriction of the upper right corner being set to 0.
+    (also for a batch of parameter arrays (n x 5))
     """
     k = 2
-    mu = np.zeros((k, 1))
-    mu[0] = parameters[0]
-    mu[1] = parameters[1]
-
-    A1 = np.zeros((k, k))
-    A1[0][0] = parameters[2]
-    A1[1][0] = parameters[3]
-    A1[1][1] = parameters[4]
+    parameters = np.asarray(parameters, dtype=float)
+    mu = parameters[..., :k, None].copy()
+
+    # lower triangle, in vech order
+    A1 = np.zeros(parameters.shape[:-1] + (k, k))
+    rows, columns = operators.get("vech_indices", k)
+    A1[..., rows, columns] = parameters[..., 2:5]
     return mu, A1
 
 
 def loglikelihood_gaussian_twofactorVAR1_restricted(parameters, data):
     """
-    Computes the loglikelihood function of a 2-factor Var(1) process given 
+    Computes the loglikelihood function of a 2-factor Var(1) process given
     the parameters and the data.
     Based on 3.4.5 in Lutkepohl(2007)
-    parameters consists of an array with the first two elements being the 
-    estimates for mu (2 process averages), remaining 3 elements of the 
+    parameters consists of an array with the first two elements being the
+    estimates for mu (2 process averages), remaining 3 elements of the
     parameters array are the estimates for the lower triangle of the kxk A1
     matrix. Upper part is constrained to 0.
+    A batch of parameter arrays (n x 5) gives n loglikelihoods at once.
     """
-    k = 2
     p = 1
-    T = data.shape[1] - p
 
     mu, A1 = param_to_mu_A1_restricted(parameters)
 
-    Y = data[:, p:]
-
-    Y0 = np.subtract(Y, mu)
+    Y0 = data[:, p:] - mu
 
-    X = np.subtract(data[:, :-p], mu)
+    X = data[:, :-p] - mu
 
     U = Y0 - A1 @ X
-    Sigma_u = U @ U.T / T
 
-    ll = (-k * T * 1 / 2 * np.log(2 * np.pi)
-          - T / 2 * np.log(la.det(Sigma_u))
-          - 1 / 2 * trace(U.T @ la.pinv(Sigma_u) @ U))
+    return concentrated_loglikelihood_gaussian(U)
+
+
+def loglikelihood_gaussian_twofactorVAR1_restricted_grad(parameters, data):
+    """
+    Score (gradient of "loglikelihood_gaussian_twofactorVAR1_restricted" to its 5
+    parameters), also for a batch of parameter arrays (see
+    "loglikelihood_gaussian_VARp_grad", only keeping the lower triangle of A1)
+    """
+    p = 1
+    k = 2
+
+    mu, A1 = param_to_mu_A1_restricted(parameters)
+
+    X = data[:, :-p] - mu
+    U = data[:, p:] - mu - A1 @ X
+
+    S = -_concentrated_score_U(U)
+    d_mu = np.swapaxes(np.eye(k) - A1, -1, -2) @ S.sum(axis=-1)[..., None]
+    d_A1 = S @ np.swapaxes(X, -1, -2)
 
-    return ll, Sigma_u
+    rows, columns = operators.get("vech_indices", k)
+    return np.concatenate([d_mu[..., 0], d_A1[..., rows, columns]], axis=-1)
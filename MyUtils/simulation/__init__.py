@@ -2,3 +2,4 @@ __author__ = 'jordy'
 
 import MyUtils.simulation.ornstein_uhlenbeck
 import MyUtils.simulation.normal
+import MyUtils.simulation.panel
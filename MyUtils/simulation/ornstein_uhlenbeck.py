@@ -1,77 +1,141 @@
 # =============================================================================
 # PACKAGES
 # =============================================================================
+from collections import OrderedDict
+
 import numpy as np
 import numpy.linalg as la
 import scipy.linalg as sla
+from scipy.signal import lfilter
 # =============================================================================
 # FUNCTIONS
 # =============================================================================
 # UNIVARIATE
 
 
-def univariate(x_0, kappa, theta, sigma, times, no_sims):
+def _ou_ar1_constants(kappa, theta, sigma, h=1):
     """
-    Ornstein-Uhlenbeck simulations
+    Exact discretization of the univariate OU over a step h as an AR(1):
+    x_t+h = b x_t + c + s e_t+h with e ~ N(0, 1)
     """
-    bm = np.random.normal(size=(times, no_sims))
-    ou = np.zeros_like(bm)
-    ou[0] = x_0
+    b = np.exp(-kappa * h)
+    c = theta * (1 - b)
+    s = sigma * np.sqrt(-np.expm1(-2 * kappa * h) / (2 * kappa))
+    return b, c, s
 
-    for i in range(1, times):
-        ou[i] = (np.exp(-kappa) * ou[i - 1]
-                 + theta * (1 - np.exp(-kappa))
-                 + sigma * np.sqrt(1 / (2 * kappa)
-                                   * (1 - np.exp(-2 * kappa))) * bm[i])
+
+def _ou_filter(x_0, b, c, s, bm, dtype=float):
+    """
+    Runs the AR(1) recursion over the time axis of the draws bm (times x
+    no_sims, the first row being unused) for all paths at once: lfilter per path
+    for few (long) paths, otherwise in place one time step at a time over all
+    paths (which beats lfilter once the paths no longer fit in cache)
+    """
+    ou = np.empty(bm.shape, dtype=dtype)
+    ou[0] = x_0
+    ou[1:] = bm[1:]
+    ou[1:] *= s
+    ou[1:] += c
+    if bm.shape[1] <= 512:
+        if len(bm) > 1:
+            ou[1:] = lfilter([1], [1, -b], ou[1:].T, axis=1,
+                             zi=b * ou[:1].T)[0].T
+    else:
+        for i in range(1, len(ou)):
+            ou[i] += b * ou[i - 1]
     return ou
 
 
-def univariate_Euler(x_0, kappa, theta, sigma, times, ts=1):
+def univariate(x_0, kappa, theta, sigma, times, no_sims, dtype=float,
+               rng=None):
     """
-    Ornstein-Uhlenbeck simulations based on Euler approximation
+    Ornstein-Uhlenbeck simulations (exact, unit time steps), times x no_sims.
+    The draws come from np.random unless a Generator 'rng' is passed, dtype
+    (e.g. np.float32) sets the precision of the paths.
+    """
+    if rng is None:
+        bm = np.random.normal(size=(times, no_sims))
+    else:
+        bm = rng.standard_normal((times, no_sims), dtype=dtype)
+    return _ou_filter(x_0, *_ou_ar1_constants(kappa, theta, sigma), bm,
+                      dtype=dtype)
+
+
+def univariate_chunks(x_0, kappa, theta, sigma, times, no_sims,
+                      chunk_size=100_000, dtype=np.float32, rng=None):
+    """
+    Generator version of "univariate" for path counts that do not fit in
+    memory, yielding the paths in blocks of (at most) times x chunk_size
+    """
+    rng = np.random.default_rng(rng)
+    constants = _ou_ar1_constants(kappa, theta, sigma)
+    for start in range(0, no_sims, chunk_size):
+        n = min(chunk_size, no_sims - start)
+        bm = rng.standard_normal((times, n), dtype=dtype)
+        yield _ou_filter(x_0, *constants, bm, dtype=dtype)
+
+
+def univariate_Euler(x_0, kappa, theta, sigma, times, ts=1, no_sims=1,
+                     dtype=float, rng=None):
     """
-    ou = [x_0]
-    bm = np.random.normal(size=times)
+    Ornstein-Uhlenbeck simulations based on Euler approximation (which equals
+    Milstein, the noise being additive), times x no_sims.
+    ts is the time step, or an array of the times - 1 (irregular) steps.
+    """
+    if rng is None:
+        bm = np.random.normal(size=(times, no_sims))
+    else:
+        bm = rng.standard_normal((times, no_sims), dtype=dtype)
+
+    ts = np.asarray(ts, dtype=float)
+    if ts.ndim == 0:
+        # constant step: an AR(1) like the exact scheme
+        return _ou_filter(x_0, 1 - kappa * ts, kappa * theta * ts,
+                          sigma * np.sqrt(ts), bm, dtype=dtype)
+
+    if ts.shape != (times - 1,):
+        raise ValueError("ts should be a scalar or hold times - 1 steps")
+    ou = np.empty(bm.shape, dtype=dtype)
+    ou[0] = x_0
+    ou[1:] = bm[1:]
+    ou[1:] *= (sigma * np.sqrt(ts))[:, None]
+    ou[1:] += (kappa * theta * ts)[:, None]
+    b = 1 - kappa * ts
     for i in range(1, times):
-        drift = kappa * (theta - ou[i - 1]) * ts
-        diffusion = sigma * np.sqrt(ts) * bm[i]
-        ou.append(ou[i - 1] + drift + diffusion)
+        ou[i] += b[i - 1] * ou[i - 1]
     return ou
 
+
 # MULTIVARIATE
 
 
+def _alpha(x):
+    """
+    [exp(x) - 1]/x elementwise (1 at x = 0), also for complex x
+    """
+    x = np.asarray(x)
+    zero = x == 0
+    return np.where(zero, 1.0, np.expm1(x) / np.where(zero, 1.0, x))
+
+
 def alphav(x):
     """
     compute [exp(x) - 1]/x
 
-    when x is a vector, (alpha(x) => see Koijen et al. (2005))
+    when x is a vector, or a stack of them (alpha(x) => see Koijen et al.
+    (2005))
     """
-    nc = x.shape[0]
-    ax = np.expm1(x)
-    for c in range(0, nc):
-        if x[c] != 0.0:
-            ax[c] /= x[c]
-        else:
-            ax[c] = 1.0
-    return ax
+    return _alpha(x)
 
 
 def alpham(x):
     """
     compute [exp(x) - 1]/x
 
-    when x is a matrix, (alpha(x) => see Koijen et al. (2005))
+    when x is a matrix, or a stack of them (alpha(x) => see Koijen et al.
+    (2005))
     """
-    nr, nc = x.shape
-    ax = np.expm1(x)
-    for r in range(0, nr):
-        for c in range(0, nc):
-            if x[r, c] != 0.0:
-                ax[r, c] /= x[r, c]
-            else:
-                ax[r, c] = 1.0
-    return ax
+    return _alpha(x)
 
 
 def multivariate_parameters(Theta, Kappa, Sigma):
@@ -91,55 +155,129 @@ def mu_Gamma_Sigma_h(Theta_0, Theta_1, Sigma_Y, h):
     Computes the elements for an exact discretization of the multivariate OU
     process.
     Y_{t+h} = mu_h + Gamma_h @ Y_t + eps_{t+h} with eps_{t+h} ~ N(0, Sigma_h)
+    Parameters can be stacks (... x k, ... x k x k) of parameter sets, giving
+    stacks of discretizations.
     """
+    Theta_0, Theta_1, Sigma_Y = (np.asarray(x) for x in (Theta_0, Theta_1, Sigma_Y))
 
     l, v = la.eig(Theta_1)
-    no_factors = len(Theta_0)
+    v_inv = la.inv(v)
 
     # mu
-    F = h * np.diag(alphav(l * h))
-    mu = v @ F @ la.inv(v) @ Theta_0
+    F = h * alphav(l * h)
+    mu = v @ (F * (v_inv @ Theta_0[..., None])[..., 0])[..., None]
+    mu = mu[..., 0]
 
     # Gamma
     G = sla.expm(Theta_1 * h)
 
     # Sigma
-    sqrtV = la.inv(v) @ Sigma_Y
-    lam = np.kron(np.ones((no_factors, 1)), l)
-    A = (lam + lam.T) * h
-    V = sqrtV @ sqrtV.T * h * alpham(A)
-    Sigma_h = v @ V @ v.T
+    sqrtV = v_inv @ Sigma_Y
+    A = (l[..., :, None] + l[..., None, :]) * h
+    V = sqrtV @ np.swapaxes(sqrtV, -1, -2) * h * alpham(A)
+    Sigma_h = v @ V @ np.swapaxes(v, -1, -2)
 
     return mu, G, Sigma_h
 
 
+class Discretization(object):
+    """
+    Exact discretization of a multivariate OU for a step h, Y_t+h = mu_h +
+    Gamma_h @ Y_t + chol_h @ e_t+h with e ~ N(0, I), and, when Gamma_h is
+    (well-conditioned) diagonalizable as P @ diag(w) @ P^-1, its eigen-space
+    form: every factor of P^-1 @ Y is an independent (complex) AR(1)
+    """
+
+    def __init__(self, Theta_0, Theta_1, Sigma_Y, h, max_cond=1e8):
+        mu, Gamma, Sigma_h = mu_Gamma_Sigma_h(Theta_0, Theta_1, Sigma_Y, h)
+        self.mu = np.real_if_close(mu)
+        self.Gamma = np.real_if_close(Gamma)
+        self.chol = la.cholesky(np.real_if_close(Sigma_h))
+
+        w, P = la.eig(self.Gamma)
+        if np.isfinite(la.cond(P)) and la.cond(P) < max_cond:
+            self.w, self.P, self.P_inv = w, P, la.inv(P)
+        else:
+            self.w = self.P = self.P_inv = None
+
+    @property
+    def diagonalizable(self):
+        return self.w is not None
+
+
+_discretizations = OrderedDict()
+
+
+def discretization(Theta_0, Theta_1, Sigma_Y, h, maxsize=128):
+    """
+    "Discretization" of the parameter set, cached (LRU, at most maxsize
+    parameter sets) as calibrations simulate the same parameters repeatedly
+    """
+    arrays = [np.ascontiguousarray(x, dtype=float)
+              for x in (Theta_0, Theta_1, Sigma_Y)]
+    key = tuple((x.shape, x.tobytes()) for x in arrays) + (float(h),)
+    if key in _discretizations:
+        _discretizations.move_to_end(key)
+        return _discretizations[key]
+
+    _discretizations[key] = Discretization(*arrays, h)
+    while len(_discretizations) > maxsize:
+        _discretizations.popitem(last=False)
+    return _discretizations[key]
+
+
+def _multivariate_block(Y_0, d, eps):
+    """
+    Evolves Y_0 (k or no_sims x k) over the standard normal draws eps (no_sims x
+    k x times) with discretization d: in one filter per factor when
+    diagonalizable, otherwise one matmul over all paths per time step
+    """
+    shocks = np.einsum('ij,sjt->sit', d.chol, eps)
+    shocks += d.mu[:, None]
+    Y_0 = np.broadcast_to(Y_0, (len(eps), len(d.mu)))
+
+    if d.diagonalizable:
+        u = np.einsum('ij,sjt->sit', d.P_inv, shocks)
+        z_0 = Y_0 @ d.P_inv.T
+        for j, w in enumerate(d.w):
+            u[:, j] = lfilter([1], [1, -w], u[:, j], axis=-1,
+                              zi=w * z_0[:, j, None])[0]
+        return np.einsum('ij,sjt->sit', d.P, u).real
+
+    Y_t = shocks
+    Y_t[:, :, 0] += Y_0 @ d.Gamma.T
+    for t in range(1, Y_t.shape[-1]):
+        Y_t[:, :, t] += Y_t[:, :, t - 1] @ d.Gamma.T
+    return Y_t
+
+
 def multivariate(Y_0, Theta_0, Theta_1, Sigma_Y, no_times, h, no_sims):
     """
     Simulates a multivariate OU process
     OU: dX_t = K(Theta - X_t)dt + Sigma * dW_t
     OU: DY_t = (Theta0 + Theta1 * Y_t)dt + Sigma_Y * dZ_t
     simulations: Y_tilde_{t+h} = mu_h + Gamma_h * Y_tilde_t + eps_{t+h}
-    with eps_{t+h} ~ N(0, Sigma_h)    
+    with eps_{t+h} ~ N(0, Sigma_h)
+    Returns no_sims x no_factors x no_times
     """
     no_factors = len(Y_0)
-
-    # transform OU parameters into mu_h, Gamma_h, Sigma_h for simulations
-    mu_h, Gamma_h, Sigma_h = mu_Gamma_Sigma_h(Theta_0, Theta_1, Sigma_Y, h)
-
-    S = la.cholesky(Sigma_h)  # S @ S = Sigma_h
-
+    d = discretization(Theta_0, Theta_1, Sigma_Y, h)
     eps = np.random.normal(0., 1., (no_sims, no_factors, no_times))
+    return _multivariate_block(np.asarray(Y_0, dtype=float), d, eps)
 
-    eps = S @ eps
-
-    Y_t = np.zeros_like(eps)
-
-    # Evolve the state-variables for all remaining times
-    # first observation
-    Y_t[:, :, 0] = mu_h + Gamma_h @ Y_0 + eps[:, :, 0]
 
-    # future observations
-    for t in range(0, no_times - 1):
-        Y_t[:, :, t + 1] += (mu_h + Y_t[:, :, t] @ Gamma_h.transpose()
-                             + eps[:, :, t + 1])
-    return Y_t
+def multivariate_blocks(Y_0, Theta_0, Theta_1, Sigma_Y, no_times, h, no_sims,
+                        block_size=250, rng=None):
+    """
+    Generator version of "multivariate", yielding the paths in consecutive time
+    blocks (no_sims x no_factors x at most block_size) so memory stays bounded
+    """
+    rng = np.random.default_rng(rng)
+    d = discretization(Theta_0, Theta_1, Sigma_Y, h)
+    Y_t = np.asarray(Y_0, dtype=float)
+    for start in range(0, no_times, block_size):
+        n = min(block_size, no_times - start)
+        eps = rng.standard_normal((no_sims, len(d.mu), n))
+        block = _multivariate_block(Y_t, d, eps)
+        Y_t = block[:, :, -1]
+        yield block
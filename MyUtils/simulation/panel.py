@@ -0,0 +1,60 @@
+# =============================================================================
+# PACKAGES
+# =============================================================================
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+
+
+def unbalanced_panel(
+    N, T, K=1, missing_rate=0.0, causality=0.3, freq="D", burn_in=50, seed=None
+):
+    """
+    Synthetic unbalanced panel of N entities with [y, x] columns, e.g. to test or
+    benchmark "PanelGC".
+    x is an AR(1) and y depends on its own K lags and on the K lags of x (which
+    get a total weight of 'causality', 0 meaning no Granger causality).
+    Every entity covers a random stretch of T / 2 to T periods of a common grid of
+    T periods (of freq) and a fraction 'missing_rate' of all values is set to nan.
+    Returns a DataFrame with an (entity, time) MultiIndex.
+    """
+    rng = np.random.default_rng(seed)
+    periods = T + burn_in
+
+    e = rng.standard_normal((periods, 2, N))
+    x = np.zeros((periods, N))
+    y = np.zeros((periods, N))
+    for t in range(1, periods):
+        x[t] = 0.5 * x[t - 1] + e[t, 1]
+    for t in range(K, periods):
+        y[t] = (
+            0.2 / K * y[t - K : t].sum(axis=0)
+            + causality / K * x[t - K : t].sum(axis=0)
+            + e[t, 0]
+        )
+    y, x = y[burn_in:], x[burn_in:]
+
+    # random stretch of the grid per entity
+    lengths = rng.integers(T // 2, T + 1, N)
+    starts = rng.integers(0, T - lengths + 1)
+    t = np.arange(T)
+    time, entity = np.nonzero(
+        (t[:, None] >= starts) & (t[:, None] < starts + lengths)
+    )
+    order = np.lexsort((time, entity))
+    time, entity = time[order], entity[order]
+
+    values = np.column_stack([y[time, entity], x[time, entity]])
+    values[rng.random(values.shape) < missing_rate] = np.nan
+
+    index = pd.MultiIndex.from_arrays(
+        [
+            np.array([f"entity_{i}" for i in range(N)])[entity],
+            pd.date_range("2000-01-01", periods=T, freq=freq)[time],
+        ],
+        names=["entity", "time"],
+    )
+    return pd.DataFrame(values, index=index, columns=["y", "x"])
@@ -1,7 +1,11 @@
 # =============================================================================
 # Packages
 # =============================================================================
+import math
+from collections import OrderedDict
+
 import numpy as np
+import scipy.sparse as sparse
 # =============================================================================
 # support functions
 # =============================================================================
@@ -10,9 +14,13 @@ import numpy as np
 def vec(x):
     """
     performs column stacking operator
+    (on the last two axes for stacks of matrices (..., m, n))
     """
 #    return x.reshape((-1, 1), order='F')
-    return x.flatten(order='F')
+    x = np.asarray(x)
+    if x.ndim <= 2:
+        return x.flatten(order='F')
+    return np.swapaxes(x, -1, -2).reshape(x.shape[:-2] + (-1,))
 
 
 def elimination_matrix_save_first_p_elements(p, k):
@@ -20,161 +28,218 @@ def elimination_matrix_save_first_p_elements(p, k):
     Return an elimination matrix of size pxk, with the first p elements of
     the diagonal being ones
     """
-    p, k = int(p), int(k)
-    L = np.zeros((p, k))
-    for i in range(p):
-        L[i, i] = 1
-    return L
+    return np.eye(int(p), int(k))
 
 
 def devec(elements, shape=None):
     """
     Reverses the vec operation. In case no shape is given, a square matrix gets
-    returned based on the lenght of th elements-array
+    returned based on the lenght of th elements-array.
+    Stacks of vectors (..., m * n) give stacks of matrices (..., m, n).
     """
-    if shape is not None:
-        A = np.zeros(shape)
-    else:
-        k = int(np.sqrt(len(elements)))
-        A = np.zeros((k, k))
+    elements = np.asarray(elements, dtype=float)
+    if shape is None:
+        k = int(np.sqrt(elements.shape[-1]))
+        shape = (k, k)
 
-    nbr_row = A.shape[0]
-    nbr_col = A.shape[1]
+    nbr_row, nbr_col = shape
+    A = elements.reshape(elements.shape[:-1] + (nbr_col, nbr_row))
+    return np.swapaxes(A, -1, -2).copy()
 
-    e = 0
-    for i in range(nbr_col):
-        for j in range(nbr_row):
-            A[j][i] = elements[e]
-            e += 1
 
-    return A
+def _nbytes(operator):
+    """
+    Memory taken by an operator: array(s) or scipy.sparse matrix
+    """
+    if sparse.issparse(operator):
+        return operator.data.nbytes + operator.indices.nbytes + operator.indptr.nbytes
+    if isinstance(operator, tuple):
+        return sum(_nbytes(o) for o in operator)
+    return operator.nbytes
 
 
-def elimination_matrix_vech(k):
+class OperatorRegistry(object):
     """
-    Constructs the elimination matrix that, multiplied with the vectorization
-    of matrix x, returns the half-vectorization of matrix x
+    LRU cache of operators that only depend on a dimension k (index maps as
+    read-only arrays, elimination/duplication matrices as scipy.sparse), built
+    on first use by builders[name](k). Takes at most 'max_bytes' (bar the most
+    recent operator): the least recently used operators are evicted first.
+    Returned operators are shared, so they are not to be modified.
     """
-    n = triangular_sum(k)
-    L = np.zeros((n, k**2))
-    row = 0
-    column = 0
-    for i in range(k, 0, -1):
-        for _ in range(i):
-            L[row][column] = 1
-            row += 1
-            column += 1
-        column += k - i + 1
 
-    return L
+    def __init__(self, builders, max_bytes=2**26):
+        self.builders = builders
+        self.max_bytes = max_bytes
+        self._operators = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
 
+    def get(self, name, k):
+        key = (name, int(k))
+        if key in self._operators:
+            self.hits += 1
+            self._operators.move_to_end(key)
+            return self._operators[key]
 
-def duplication_matrix(m):
+        self.misses += 1
+        operator = self.builders[name](int(k))
+        self._operators[key] = operator
+        self.nbytes += _nbytes(operator)
+        while self.nbytes > self.max_bytes and len(self._operators) > 1:
+            _, evicted = self._operators.popitem(last=False)
+            self.nbytes -= _nbytes(evicted)
+        return operator
+
+    def clear(self):
+        self._operators.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._operators)
+
+
+def _read_only(*arrays):
+    for array in arrays:
+        array.setflags(write=False)
+    return arrays
+
+
+def _build_vech_indices(k):
     """
-    Given the shape m of a symmetric square matrix x, this function returns
-    the duplication matrix D, such that D @ vech(x) = vec(x)
+    (rows, columns) of the elements on and below the diagonal of a kxk matrix,
+    in the column stacking order of vech (the upper triangle of the transpose)
+    """
+    columns, rows = np.triu_indices(k)
+    return _read_only(rows, columns)
+
+
+def _build_duplication_indices(k):
     """
-    D = np.zeros((m**2, int(1 / 2 * m * (m + 1))))
-    row = 0
-    column = 0
-    for i in range(m, 0, -1):
-        for _ in range(i):
-            D[row][column] = 1
-            column += 1
-            row += 1
+    Position in vech(x) of every element of vec(x), x being symmetric kxk
+    """
+    rows, columns = operators.get("vech_indices", k)
+    position = np.zeros((k, k), dtype=np.intp)
+    position[rows, columns] = np.arange(len(rows))
+    position[columns, rows] = np.arange(len(rows))
+    return _read_only(vec(position))[0]
+
+
+def _build_elimination_matrix(k):
+    rows, columns = operators.get("vech_indices", k)
+    n = len(rows)
+    return sparse.csr_matrix(
+        (np.ones(n), (np.arange(n), columns * k + rows)), shape=(n, k**2))
 
-        row += m - i + 1
 
-    row = m
-    column = 1
-    for i in range(m - 1, 0, -1):
-        for _ in range(i):
-            D[row][column] = 1
-            column += 1
-            row += m
-        column += 1
-        row = m + (m - i) * (m + 1)
+def _build_duplication_matrix(m):
+    position = operators.get("duplication_indices", m)
+    return sparse.csr_matrix(
+        (np.ones(m**2), (np.arange(m**2), position)),
+        shape=(m**2, triangular_sum(m)))
 
-    return D
+
+# shared by everything that (de)vectorizes (symmetric) matrices
+operators = OperatorRegistry({
+    "vech_indices": _build_vech_indices,
+    "duplication_indices": _build_duplication_indices,
+    "elimination_matrix": _build_elimination_matrix,
+    "duplication_matrix": _build_duplication_matrix,
+})
+
+
+def elimination_matrix_vech(k):
+    """
+    Constructs the elimination matrix that, multiplied with the vectorization
+    of matrix x, returns the half-vectorization of matrix x.
+    Returned as a (shared, so not to be modified) scipy.sparse CSR matrix.
+    """
+    return operators.get("elimination_matrix", k)
+
+
+def duplication_matrix(m):
+    """
+    Given the shape m of a symmetric square matrix x, this function returns
+    the duplication matrix D, such that D @ vech(x) = vec(x).
+    Returned as a (shared, so not to be modified) scipy.sparse CSR matrix.
+    """
+    return operators.get("duplication_matrix", m)
 
 
 def vech(x):
     """
     performs column stacking operator on a matrix for only the elements on
-    and below the diagonal
+    and below the diagonal (on the last two axes for stacks of matrices)
     """
-    k = x.shape[0]
-    L = elimination_matrix_vech(k)
-    return L @ vec(x)
+    rows, columns = operators.get("vech_indices", x.shape[-1])
+    return np.asarray(x)[..., rows, columns]
 
 
 def devech(elements):
     """
-    Reverses the vech operation.
+    Reverses the vech operation (also for stacks of vectors (..., k(k + 1)/2)).
     """
-    e = 0
-    k = reverse_triangular_sum(len(elements))
-    A = np.zeros((k, k))
+    elements = np.asarray(elements, dtype=float)
+    k = reverse_triangular_sum(elements.shape[-1])
+    position = operators.get("duplication_indices", k)
+    # symmetric, so column stacking or not does not matter
+    return elements[..., position].reshape(elements.shape[:-1] + (k, k))
 
-    # filing bottom triangle + diagonal
-    row = 0
-    col = 0
-    for i in range(k):
-        for j in range(k - 1, i - 1, -1):
-            A[row][col] = elements[e]
 
-            row += 1
-            e += 1
-        col += 1
-        row = col
+def trace(x):
+    """
+    trace of a matrix (of every matrix for stacks (..., n, n))
+    """
+    return np.trace(x, axis1=-2, axis2=-1)
 
-    # filling upper half (symmetric matrix)
-    row = 0
-    for i in range(k - 1):
-        for j in range(k - 1, i, -1):
-            A[row][j] = A[j][row]
-        row += 1
 
-    return A
+def trace_product(A, B):
+    """
+    tr(AB) without forming AB (also for stacks of matrices)
+    """
+    return np.einsum('...ij,...ji->...', A, B)
 
 
-def trace(x):
-    n = x.shape[0]
-    som = 0.
-    for i in range(n):
-        som += x[i, i]
-    return som
+def trace_quadratic_form(A, B):
+    """
+    tr(A'BA) without forming A'BA (also for stacks of matrices). For A being kxT
+    and B kxk, this only needs BA (kxT) instead of the TxT product.
+    """
+    return np.einsum('...ki,...kj,...ji->...', A, B, A, optimize=True)
 
 
 def triangular_sum(n):
     """
-    Computes the triangular sum of any positive natural number
+    Computes the triangular sum of any positive natural number: n(n + 1)/2
+    (elementwise for arrays)
     """
-    if n == 1:
-        return n
-
-    elif n == 0:
-        return 0
+    if np.ndim(n) == 0:
+        n = int(n)
+        if n < 0:
+            raise ValueError('n must be a natural number')
+        return n * (n + 1) // 2
 
-    else:
-        return triangular_sum(n - 1) + n
+    n = np.asarray(n, dtype=np.int64)
+    if np.any(n < 0):
+        raise ValueError('n must be a natural number')
+    return n * (n + 1) // 2
 
 
 def reverse_triangular_sum(x):
     """
-    Returns the integer that leads to triangular number x
+    Returns the integer that leads to triangular number x: (sqrt(8x + 1) - 1)/2
+    (elementwise for arrays)
     """
-    t = x
-    i = 1
-    while t > 0:
-        t -= i
-        i += 1
-    try:
-        assert t == 0, 'This is not a triangular number'
-    except AssertionError:
-        raise
+    if np.ndim(x) == 0:
+        x = int(x)
+        root = math.isqrt(8 * x + 1) if x >= 0 else -1
+        assert root * root == 8 * x + 1, 'This is not a triangular number'
+        return (root - 1) // 2
 
-    return i - 1
+    x = np.asarray(x, dtype=np.int64)
+    root = np.round(np.sqrt(np.maximum(8 * x + 1, 0))).astype(np.int64)
+    assert np.all(root * root == 8 * x + 1), 'This is not a triangular number'
+    return (root - 1) // 2
 
 
 def sqrtMatrix(Sigma):
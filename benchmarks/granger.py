@@ -0,0 +1,83 @@
+"""
+asv benchmarks of the Granger causality tests, on synthetic unbalanced panels
+("MyUtils.simulation.panel.unbalanced_panel").
+
+    asv run                 # benchmark the current commit
+    asv continuous HEAD~1 HEAD
+    asv publish && asv preview
+
+time_* benchmarks track wall time, peakmem_* the peak RSS of the process.
+"""
+import warnings
+
+from MyUtils.PanelGC import PanelGC, my_grangercausality
+from MyUtils.simulation.panel import unbalanced_panel
+
+
+class MyGrangerCausality:
+    params = ([250, 2500], [1, 5], [0.0, 0.05])
+    param_names = ["T", "K", "missing_rate"]
+
+    def setup(self, T, K, missing_rate):
+        self.df = unbalanced_panel(1, T, K, missing_rate, seed=0).droplevel(0)
+
+    def time_my_grangercausality(self, T, K, missing_rate):
+        my_grangercausality(self.df, K)
+
+    def time_my_grangercausality_lean(self, T, K, missing_rate):
+        my_grangercausality(self.df, K, lean=True)
+
+    def peakmem_my_grangercausality(self, T, K, missing_rate):
+        my_grangercausality(self.df, K)
+
+
+class PanelGCIndividual:
+    params = ([100, 1000], [250], [1, 5], [0.0, 0.05], ["statsmodels", "numpy"])
+    param_names = ["N", "T", "K", "missing_rate", "engine"]
+
+    def setup(self, N, T, K, missing_rate, engine):
+        if engine == "statsmodels" and N > 100:
+            # a loop over OLS fits, too slow to be worth repeating
+            raise NotImplementedError
+        warnings.simplefilter("ignore")
+        self.data = unbalanced_panel(N, T, K, missing_rate, seed=0)
+        self.panel = PanelGC(
+            self.data, K, freq="D", engine=engine, unused_entity_warning=False
+        )
+        # regular time grid is built once, outside of the timings
+        self.panel._stack_entities()
+
+    def time_perform_individual_gc(self, N, T, K, missing_rate, engine):
+        self.panel._perform_individual_gc()
+
+    def peakmem_perform_individual_gc(self, N, T, K, missing_rate, engine):
+        self.panel._perform_individual_gc()
+
+    def time_DH_test_from_scratch(self, N, T, K, missing_rate, engine):
+        PanelGC(
+            self.data, K, freq="D", engine=engine, unused_entity_warning=False
+        ).DH_test()
+
+    def peakmem_DH_test_from_scratch(self, N, T, K, missing_rate, engine):
+        PanelGC(
+            self.data, K, freq="D", engine=engine, unused_entity_warning=False
+        ).DH_test()
+
+
+class DHTest:
+    params = ([100, 10000], [1, 5])
+    param_names = ["N", "K"]
+
+    def setup(self, N, K):
+        warnings.simplefilter("ignore")
+        self.panel = PanelGC(
+            unbalanced_panel(N, 250, K, 0.05, seed=0),
+            K,
+            freq="D",
+            engine="numpy",
+            unused_entity_warning=False,
+        )
+        self.panel._perform_individual_gc()
+
+    def time_DH_test(self, N, K):
+        self.panel.DH_test(zbar=True)